@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from PIL import Image
+from captcha_ocr import PIPELINES, tesserocr
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+
+def label_for(filename):
+    """
+    Expected captcha text from a file name: 'aB3dE.png' or 'aB3dE_2.png' -> 'aB3dE'.
+    """
+    return os.path.splitext(filename)[0].split('_')[0]
+
+
+def load_samples(folder):
+    samples = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with Image.open(os.path.join(folder, name)) as img:
+                img.load()
+                samples.append((name, label_for(name), img.copy()))
+    return samples
+
+
+def bench_pipeline(name, pipeline, samples, show_misses=False):
+    # First call pays for engine start-up (e.g. loading the tesserocr model); keep it out of the timings
+    pipeline.solve(samples[0][2])
+
+    timings = []
+    exact = case_insensitive = 0
+    for file_name, label, image in samples:
+        start = time.perf_counter()
+        text = pipeline.solve(image)
+        timings.append((time.perf_counter() - start) * 1000)
+        if text == label:
+            exact += 1
+        if text.lower() == label.lower():
+            case_insensitive += 1
+        elif show_misses:
+            print(f"  [{name}] {file_name}: expected {label!r}, got {text!r}")
+
+    return {
+        "pipeline": name,
+        "engine": pipeline.engine.name,
+        "samples": len(samples),
+        "accuracy": exact / len(samples),
+        "accuracy_ignore_case": case_insensitive / len(samples),
+        "ms_per_solve_mean": statistics.mean(timings),
+        "ms_per_solve_p95": sorted(timings)[int(0.95 * (len(timings) - 1))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline captcha OCR benchmark. Image file names must start with the expected text "
+                    "(e.g. aB3dE.png or aB3dE_2.png)."
+    )
+    parser.add_argument("folder", help="Folder of saved captcha images")
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES), choices=list(PIPELINES))
+    parser.add_argument("--both-engines", action="store_true",
+                        help="Also run every pipeline with the pytesseract engine when tesserocr is installed")
+    parser.add_argument("--show-misses", action="store_true")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    samples = load_samples(args.folder)
+    if not samples:
+        print(f"No images found in {args.folder}")
+        return
+    print(f"Loaded {len(samples)} captcha images from {args.folder}")
+
+    results = []
+    for name in args.pipelines:
+        pipeline = PIPELINES[name]()
+        results.append(bench_pipeline(name, pipeline, samples, args.show_misses))
+        if args.both_engines and tesserocr is not None and pipeline.engine.in_process:
+            pipeline.engine.in_process = False
+            results.append(bench_pipeline(name, pipeline, samples, args.show_misses))
+
+    print(f"{'pipeline':<18} {'engine':<12} {'accuracy':>9} {'no-case':>9} {'ms/solve':>9} {'p95 ms':>9}")
+    for r in results:
+        print(f"{r['pipeline']:<18} {r['engine']:<12} {r['accuracy']:>9.1%} {r['accuracy_ignore_case']:>9.1%} "
+              f"{r['ms_per_solve_mean']:>9.1f} {r['ms_per_solve_p95']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
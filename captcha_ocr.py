@@ -0,0 +1,161 @@
+import io
+import string
+import threading
+from PIL import Image, ImageFilter, ImageOps
+try:
+    # In-process Tesseract bindings (optional); avoids spawning tesseract.exe for every captcha
+    import tesserocr
+except ImportError:
+    tesserocr = None
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+CAPTCHA_CHARS = string.ascii_letters + string.digits
+
+# Where the captcha image can be found, most specific first
+CAPTCHA_IMAGE_SELECTORS = (
+    'img[src*="captcha" i]',
+    'img[id*="captcha" i]',
+    '#check-input >> xpath=../img',
+    '#check-input >> xpath=../..//img',
+)
+
+
+def otsu_threshold(image):
+    """
+    Otsu's threshold for a grayscale PIL image (maximizes between-class variance).
+    """
+    hist = image.histogram()[:256]
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_bg = weight_bg = 0
+    best_t, best_var = 127, -1.0
+    for t, h in enumerate(hist):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += t * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        var = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if var > best_var:
+            best_t, best_var = t, var
+    return best_t
+
+
+class TesseractEngine:
+    """
+    Runs Tesseract on a PIL image. Uses tesserocr (one API handle per thread, kept alive
+    between calls) when installed, otherwise falls back to pytesseract, which starts a
+    tesseract process per call.
+    """
+
+    def __init__(self, psm=7, whitelist=CAPTCHA_CHARS, in_process=True):
+        self.psm = psm
+        self.whitelist = whitelist
+        self.in_process = in_process and tesserocr is not None
+        self._local = threading.local()
+
+    @property
+    def name(self):
+        return "tesserocr" if self.in_process else "pytesseract"
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(psm=self.psm)
+            if self.whitelist:
+                api.SetVariable("tessedit_char_whitelist", self.whitelist)
+            self._local.api = api
+        return api
+
+    def image_to_string(self, image):
+        if self.in_process:
+            api = self._api()
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        if pytesseract is None:
+            raise RuntimeError("No OCR engine available. Please install pytesseract (or tesserocr).")
+        config = f"--psm {self.psm}"
+        if self.whitelist:
+            config += f" -c tessedit_char_whitelist={self.whitelist}"
+        return pytesseract.image_to_string(image, config=config)
+
+
+class CaptchaPipeline:
+    """
+    Preprocessing + OCR for the customs captcha:
+    grayscale -> upscale -> autocontrast -> median denoise -> Otsu binarization -> white border -> Tesseract.
+    Each step can be turned off to compare configurations (see bench_captcha.py).
+    """
+
+    def __init__(self, scale=3, denoise=3, binarize=True, border=10, psm=7, whitelist=CAPTCHA_CHARS,
+                 in_process=True):
+        self.scale = scale
+        self.denoise = denoise
+        self.binarize = binarize
+        self.border = border
+        self.engine = TesseractEngine(psm=psm, whitelist=whitelist, in_process=in_process)
+
+    def preprocess(self, image):
+        image = image.convert("L")
+        if self.scale and self.scale != 1:
+            image = image.resize((image.width * self.scale, image.height * self.scale), Image.LANCZOS)
+        image = ImageOps.autocontrast(image)
+        if self.denoise:
+            image = image.filter(ImageFilter.MedianFilter(self.denoise))
+        if self.binarize:
+            threshold = otsu_threshold(image)
+            image = image.point(lambda p: 255 if p > threshold else 0)
+            # Tesseract expects dark text on a light background
+            if sum(image.histogram()[:128]) > image.width * image.height / 2:
+                image = ImageOps.invert(image)
+        if self.border:
+            image = ImageOps.expand(image, border=self.border, fill=255)
+        return image
+
+    def solve(self, image):
+        """
+        Returns the alphanumeric text read from a captcha image (PIL image or bytes).
+        """
+        if isinstance(image, (bytes, bytearray)):
+            image = Image.open(io.BytesIO(image))
+        text = self.engine.image_to_string(self.preprocess(image))
+        return "".join(c for c in text if c.isalnum())
+
+
+# Named configurations for bench_captcha.py; "baseline" mirrors the old untuned call and
+# "tuned" (preprocessing + single-line PSM + whitelist) is what the customs script uses
+PIPELINES = {
+    "baseline": lambda: CaptchaPipeline(scale=1, denoise=0, binarize=False, border=0, psm=3, whitelist=None,
+                                        in_process=False),
+    "binarize": lambda: CaptchaPipeline(scale=3, denoise=0, binarize=True, psm=3, whitelist=None),
+    "binarize+denoise": lambda: CaptchaPipeline(scale=3, denoise=3, binarize=True, psm=3, whitelist=None),
+    "tuned": lambda: CaptchaPipeline(),
+    "tuned-psm8": lambda: CaptchaPipeline(psm=8),
+}
+
+DEFAULT_PIPELINE = "tuned"
+
+
+def ocr_available():
+    return tesserocr is not None or pytesseract is not None
+
+
+async def screenshot_captcha(page):
+    """
+    Returns a PNG screenshot of exactly the captcha image element, or None if it can't be found.
+    """
+    for selector in CAPTCHA_IMAGE_SELECTORS:
+        locator = page.locator(selector)
+        try:
+            if await locator.count() > 0:
+                return await locator.first.screenshot()
+        except Exception:
+            continue
+    return None
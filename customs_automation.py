@@ -1,116 +1,313 @@
+import argparse
 import asyncio
 import os
+import sys
 import pandas as pd
 from playwright.async_api import async_playwright
+
+# Shared helpers live next to the Kohler scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kohler_automation'))
+from page_profile import customs_profile
+from journal import Journal, row_key
+from export import write_dataframe
+from customs_tables import extract_result_fields, has_result
 try:
-    import pytesseract
-    from PIL import Image
-    import io
+    from captcha_ocr import PIPELINES, DEFAULT_PIPELINE, ocr_available, screenshot_captcha
+    captcha_pipeline = PIPELINES[DEFAULT_PIPELINE]() if ocr_available() else None
 except ImportError:
+    captcha_pipeline = None
+if captcha_pipeline is None:
     print("OCR dependencies not found. Please install pytesseract and Pillow.")
-    pytesseract = None
 
 INPUT_FILE = 'input.xlsx'
 OUTPUT_FILE = 'output.xlsx'
 URL = 'http://customs.gov.vn:8228/index.jsp?pageId=136&cid=93'
 
+# Unattended mode: captcha attempts per row, and browser contexts working in parallel
+DEFAULT_CAPTCHA_RETRIES = 5
+DEFAULT_WORKERS = 3
+
+SUBMIT_SELECTOR = 'input[value="Lấy thông tin"], button:has-text("Lấy thông tin"), a:has-text("Lấy thông tin")'
+# Messages the portal shows (as an alert or in the page) when the captcha is wrong
+WRONG_CAPTCHA_MARKERS = (
+    'mã xác nhận không đúng',
+    'mã xác nhận không chính xác',
+    'sai mã xác nhận',
+    'mã kiểm tra không đúng',
+)
+
 # Configure Tesseract path if needed (Windows default)
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-async def create_template_if_missing():
-    if not os.path.exists(INPUT_FILE):
+def journal_path(output_file):
+    # Finished rows are appended here as they complete, so an interrupted run can --resume
+    return output_file + '.journal.jsonl'
+
+def manual_review_path(output_file):
+    # Rows the unattended mode could not finish are copied here for a human to redo (always xlsx, like --input)
+    return os.path.splitext(output_file)[0] + '.manual_review.xlsx'
+
+async def create_template_if_missing(input_file=INPUT_FILE):
+    if not os.path.exists(input_file):
         df = pd.DataFrame(columns=['SoToKhai', 'MaDoanhNghiep', 'SoCMT'])
-        df.to_excel(INPUT_FILE, index=False)
-        print(f"Created template file: {INPUT_FILE}")
+        df.to_excel(input_file, index=False)
+        print(f"Created template file: {input_file}")
         print("Please fill in the details in this file and run the script again.")
         return True
     return False
 
 async def solve_captcha(page):
-    if not pytesseract:
+    """
+    OCRs the captcha and types it into #check-input. Returns the text entered ('' if none).
+    """
+    if not captcha_pipeline:
         print("OCR not available. Please enter captcha manually.")
-        return
+        return ""
 
     try:
-        # Strategy: Find the input, get its parent (likely contains the image), and screenshot the parent
-        # Or try to find the image directly if possible. 
-        # Based on analysis, image is near #check-input.
-        
-        # Let's try to screenshot the parent of the input
         captcha_input = page.locator('#check-input')
-        parent = captcha_input.locator('..')
-        
-        # Take screenshot of the parent element which should contain the captcha image
-        screenshot_bytes = await parent.screenshot()
-        
-        image = Image.open(io.BytesIO(screenshot_bytes))
-        
-        # Perform OCR
-        text = pytesseract.image_to_string(image).strip()
-        # Clean text: remove spaces and non-alphanumeric if needed
-        clean_text = "".join(c for c in text if c.isalnum())
-        
+
+        # Screenshot exactly the captcha image element
+        screenshot_bytes = await screenshot_captcha(page)
+        if screenshot_bytes is None:
+            # Fall back to the parent of the input, which contains the image
+            screenshot_bytes = await captcha_input.locator('..').screenshot()
+
+        # Preprocess + OCR (in a thread so parallel pages keep running while Tesseract works)
+        clean_text = await asyncio.to_thread(captcha_pipeline.solve, screenshot_bytes)
+
         print(f"OCR Detected Captcha: {clean_text}")
-        
+
         if clean_text:
             await captcha_input.fill(clean_text)
         else:
             print("OCR failed to detect text.")
-            
+        return clean_text
+
     except Exception as e:
         print(f"OCR Error: {e}")
+        return ""
 
-async def process_row(page, row):
-    print(f"Processing: {row['SoToKhai']} - {row['MaDoanhNghiep']}")
-    
+def make_result(row, status, fields=None, message=''):
+    # One output row: fixed columns first, then one column per field read from the result tables
+    return {'SoToKhai': row['SoToKhai'], 'Status': status, 'Message': message, **(fields or {})}
+
+def results_dataframe(results):
+    columns = ['SoToKhai', 'Status', 'Message']
+    for result in results:
+        columns += [key for key in result if key not in columns]
+    return pd.DataFrame(results, columns=columns)
+
+async def fill_form(page, row):
     await page.goto(URL)
-    
+
     await page.fill('#soTK', str(row['SoToKhai']))
     await page.fill('#maDN', str(row['MaDoanhNghiep']))
     await page.fill('#soCMT', str(row['SoCMT']))
-    
+
+async def read_results(page):
+    # One in-page evaluation returns every result table as structured fields
+    return await extract_result_fields(page)
+
+async def process_row(page, row):
+    print(f"Processing: {row['SoToKhai']} - {row['MaDoanhNghiep']}")
+
+    await fill_form(page, row)
+
     # Attempt OCR
     await solve_captcha(page)
-    
+
     await page.click('#check-input') # Focus input just in case
     print("Please verify Captcha and click 'Lấy thông tin'...")
-    
+
     input("Press Enter in this terminal after you have successfully searched and the results are visible (or if you want to skip)...")
-    
-    tables = await page.query_selector_all('table')
-    result_text = ""
-    for table in tables:
-        text = await table.inner_text()
-        if len(text) > 50:
-            result_text += text + "\n---\n"
-            
-    return result_text
-
-async def main():
-    if await create_template_if_missing():
-        return
 
-    df = pd.read_excel(INPUT_FILE)
-    results = []
+    return await read_results(page)
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context()
-        page = await context.new_page()
+async def submit_and_check(page, dialogs):
+    """
+    Submits the search form and classifies the response as 'ok', 'wrong_captcha' or 'unknown'.
+    `dialogs` collects alert messages raised by the page. Returns (outcome, result fields).
+    """
+    dialogs.clear()
+    await page.click(SUBMIT_SELECTOR)
+    try:
+        await page.wait_for_load_state('networkidle', timeout=15000)
+    except Exception:
+        pass
 
-        for index, row in df.iterrows():
+    page_text = (await page.locator('body').inner_text()).lower()
+    messages = " ".join(dialogs).lower()
+    if any(marker in messages or marker in page_text for marker in WRONG_CAPTCHA_MARKERS):
+        return 'wrong_captcha', {}
+    fields = await read_results(page)
+    return ('ok' if has_result(fields) else 'unknown'), fields
+
+async def process_row_unattended(page, row, dialogs, retries=DEFAULT_CAPTCHA_RETRIES):
+    """
+    Fills, OCRs and submits the form without a human, re-fetching the captcha after a miss.
+    Returns (status, fields, message); status is 'Done' or 'ManualReview'.
+    """
+    for attempt in range(1, retries + 1):
+        print(f"Processing: {row['SoToKhai']} - {row['MaDoanhNghiep']} (attempt {attempt}/{retries})")
+        # Reloading the form also fetches a fresh captcha
+        await fill_form(page, row)
+        if not await solve_captcha(page):
+            continue
+        outcome, fields = await submit_and_check(page, dialogs)
+        if outcome == 'ok':
+            return 'Done', fields, ''
+
+        print(f"{row['SoToKhai']}: {'wrong captcha' if outcome == 'wrong_captcha' else 'no result table'}, retrying...")
+    return 'ManualReview', {}, f"No result after {retries} captcha attempts"
+
+async def _unattended_worker(browser, profile, work, finished, retries):
+    context = await browser.new_context()
+    await profile.attach(context)
+    page = await context.new_page()
+    dialogs = []
+
+    async def on_dialog(dialog):
+        dialogs.append(dialog.message)
+        await dialog.dismiss()
+
+    page.on('dialog', on_dialog)
+    try:
+        while True:
+            try:
+                index, row = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
             try:
-                data = await process_row(page, row)
-                results.append({'SoToKhai': row['SoToKhai'], 'Result': data, 'Status': 'Done'})
+                status, fields, message = await process_row_unattended(page, row, dialogs, retries)
             except Exception as e:
                 print(f"Error processing row {index}: {e}")
-                results.append({'SoToKhai': row['SoToKhai'], 'Result': str(e), 'Status': 'Error'})
+                status, fields, message = 'Error', {}, str(e)
+            await finished.put((index, row, make_result(row, status, fields, message)))
+    finally:
+        await context.close()
+
+async def iter_results_unattended(browser, profile, df, journal, workers=DEFAULT_WORKERS,
+                                  retries=DEFAULT_CAPTCHA_RETRIES):
+    """
+    Unattended version of iter_results: `workers` browser contexts process rows in parallel
+    and results are yielded in completion order.
+    """
+    done = journal.load()
+    work = asyncio.Queue()
+    for index, row in df.iterrows():
+        key = row_key(index, row['SoToKhai'])
+        if key in done:
+            yield done[key]
+        else:
+            work.put_nowait((index, row))
+
+    if work.empty():
+        return
+
+    finished = asyncio.Queue()
+
+    async def run_workers():
+        try:
+            await asyncio.gather(*(
+                _unattended_worker(browser, profile, work, finished, retries)
+                for _ in range(max(1, min(workers, work.qsize())))
+            ))
+        finally:
+            await finished.put(None)
+
+    runner = asyncio.create_task(run_workers())
+    while (item := await finished.get()) is not None:
+        index, row, result = item
+        journal.append(row_key(index, row['SoToKhai']), result)
+        yield result
+    # Surface worker crashes
+    await runner
+
+async def iter_results(page, df, journal):
+    """
+    Async generator over the input rows: yields each result dict as soon as the row is
+    finished. Rows already recorded in `journal` are yielded without being searched again;
+    new rows are appended to the journal before they are yielded.
+    """
+    done = journal.load()
+    for index, row in df.iterrows():
+        key = row_key(index, row['SoToKhai'])
+        if key in done:
+            yield done[key]
+            continue
+        try:
+            result = make_result(row, 'Done', await process_row(page, row))
+        except Exception as e:
+            print(f"Error processing row {index}: {e}")
+            result = make_result(row, 'Error', message=str(e))
+        journal.append(key, result)
+        yield result
+
+async def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE, resume=False, unattended=False,
+               workers=DEFAULT_WORKERS, retries=DEFAULT_CAPTCHA_RETRIES):
+    if await create_template_if_missing(input_file):
+        return
+
+    if unattended and captcha_pipeline is None:
+        # Without OCR every row would just reload the form `retries` times and end up in manual review
+        print("Error: --unattended needs captcha OCR (pytesseract and Pillow). Run without --unattended "
+              "to enter captchas by hand.")
+        return
+
+    df = pd.read_excel(input_file)
+    journal = Journal(journal_path(output_file))
+    if not resume:
+        journal.reset()
+
+    async with async_playwright() as p:
+        # Unattended runs need no window; the manual mode shows the browser for the human
+        browser = await p.chromium.launch(headless=unattended)
+        # Block fonts, media, trackers and non-captcha images
+        profile = customs_profile()
+
+        if unattended:
+            results = iter_results_unattended(browser, profile, df, journal, workers=workers, retries=retries)
+        else:
+            context = await browser.new_context()
+            await profile.attach(context)
+            page = await context.new_page()
+            results = iter_results(page, df, journal)
+
+        async for result in results:
+            print(f"{result['SoToKhai']}: {result['Status']}")
 
         await browser.close()
 
-    output_df = pd.DataFrame(results)
-    output_df.to_excel(OUTPUT_FILE, index=False)
-    print(f"Done. Results saved to {OUTPUT_FILE}")
+    print(profile.report())
+    # Build the output from the journal so rows from an interrupted run are included
+    keys = [row_key(index, row['SoToKhai']) for index, row in df.iterrows()]
+    output_df = results_dataframe(journal.rows_for(keys))
+    write_dataframe(output_df, output_file)
+    print(f"Done. Results saved to {output_file}")
+
+    # Queue rows that still failed for a manual pass (can be fed back in with --input)
+    statuses = {key: row['Status'] for key, row in journal.load().items()}
+    review_df = df[[statuses.get(key) != 'Done' for key in keys]]
+    review_file = manual_review_path(output_file)
+    if not review_df.empty:
+        write_dataframe(review_df, review_file)
+        print(f"{len(review_df)} rows need manual review: saved to {review_file}")
+    elif os.path.exists(review_file):
+        # Left over from an earlier run whose rows are now done
+        os.remove(review_file)
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Look up customs declarations.")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Results file: .xlsx, .csv or .parquet")
+    parser.add_argument("--resume", action="store_true", help="Skip rows already recorded by an interrupted run")
+    parser.add_argument("--unattended", action="store_true",
+                        help="Headless batch mode: submit the form automatically and retry wrong captchas")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Parallel browser contexts in unattended mode")
+    parser.add_argument("--retries", type=int, default=DEFAULT_CAPTCHA_RETRIES,
+                        help="Captcha attempts per row before it goes to manual review")
+    args = parser.parse_args()
+    asyncio.run(main(args.input, args.output, resume=args.resume, unattended=args.unattended,
+                     workers=args.workers, retries=args.retries))
@@ -0,0 +1,118 @@
+import re
+
+# Runs inside the page: returns every innermost table as a list of rows of cells, in one round trip.
+# Outer layout tables are skipped since their text just repeats the tables nested in them.
+EXTRACT_TABLES_JS = """
+() => Array.from(document.querySelectorAll('table'))
+    .filter(table => !table.querySelector('table'))
+    .map(table => Array.from(table.rows).map(row =>
+        Array.from(row.cells).map(cell => ({
+            text: (cell.innerText || '').replace(/\\s+/g, ' ').trim(),
+            header: cell.tagName === 'TH',
+        }))
+    ))
+"""
+
+# Tables with less text than this are form/layout chrome, not results (same cut-off as before)
+MIN_TABLE_TEXT = 50
+
+# Portal labels we give stable English column names; other labels are kept as they appear on the page
+FIELD_ALIASES = (
+    (re.compile(r'phân luồng|^luồng', re.IGNORECASE), 'Channel'),
+    (re.compile(r'trạng thái', re.IGNORECASE), 'Declaration Status'),
+)
+
+# A submit only counts as answered if one of these has a value: the empty search form is also
+# a table with labels, and a wrong-captcha page can be worded in ways we don't recognise
+RESULT_FIELDS = ('Declaration Status', 'Channel')
+
+
+def has_result(fields):
+    return any(str(fields.get(name) or '').strip() for name in RESULT_FIELDS)
+
+
+def clean_label(label):
+    return label.strip().rstrip(':').strip()
+
+
+def column_name(label):
+    label = clean_label(label)
+    for pattern, alias in FIELD_ALIASES:
+        if pattern.search(label):
+            return alias
+    return label
+
+
+def _is_header_row(cells):
+    return all(cell['header'] for cell in cells if cell['text'])
+
+
+def _is_record_table(rows):
+    # A lone <th colspan> caption (e.g. "THÔNG TIN TỜ KHAI") is a title, not column headers
+    headers = rows[0]
+    if len(rows) < 2 or len(headers) < 2 or not _is_header_row(headers):
+        return False
+    return all(len(row) == len(headers) for row in rows[1:])
+
+
+def _is_caption_row(cells):
+    return len(cells) == 1 and cells[0]['header']
+
+
+def parse_table(rows):
+    """
+    Turns one extracted table into {column: value}.
+    - Tables whose first row is all <th>, with as many cells as the rows below it, are read
+      as records under those headers (numbered "Header [2]" etc. when there is more than one record).
+    - Other tables are read as label/value pairs: cells 1,3,5... are labels and 2,4,6... values.
+      A single-cell caption row at the top is dropped. When two labels map to the same alias,
+      the first keeps the alias and the later ones keep their own label.
+    """
+    rows = [row for row in rows if any(cell['text'] for cell in row)]
+    if not rows:
+        return {}
+
+    fields = {}
+    if _is_record_table(rows):
+        # Record tables (e.g. containers) keep their own headers; aliases are for the declaration fields
+        headers = [clean_label(cell['text']) for cell in rows[0]]
+        records = rows[1:]
+        for number, record in enumerate(records, start=1):
+            for header, cell in zip(headers, record):
+                if not header:
+                    continue
+                key = header if len(records) == 1 else f"{header} [{number}]"
+                fields[key] = cell['text']
+        return fields
+
+    if _is_caption_row(rows[0]):
+        rows = rows[1:]
+    for row in rows:
+        texts = [cell['text'] for cell in row]
+        for i in range(0, len(texts) - 1, 2):
+            if texts[i]:
+                key = column_name(texts[i])
+                if key in fields:
+                    key = clean_label(texts[i])
+                fields[key] = texts[i + 1]
+    return fields
+
+
+def parse_tables(tables):
+    """
+    Merges the fields of every result table into one dict, ignoring tables with
+    too little text to be results.
+    """
+    fields = {}
+    for rows in tables:
+        text_length = sum(len(cell['text']) for row in rows for cell in row)
+        if text_length > MIN_TABLE_TEXT:
+            fields.update(parse_table(rows))
+    return fields
+
+
+async def extract_result_fields(page):
+    """
+    Reads all result tables on the page with a single evaluate call and returns their fields.
+    """
+    return parse_tables(await page.evaluate(EXTRACT_TABLES_JS))
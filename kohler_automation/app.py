@@ -1,54 +1,87 @@
+import time
+_script_start = time.perf_counter()
 import streamlit as st
-import pandas as pd
-import io
 import asyncio
 import sys
-import sys
 import os
-import concurrent.futures
-try:
-    import tkinter as tk
-    from tkinter import filedialog
-    TKINTER_AVAILABLE = True
-except ImportError:
-    TKINTER_AVAILABLE = False
-from scrape_kohler import process_codes
+from startup import StartupTimer, ensure_playwright_browsers
+
+# Each tool imports its own heavy dependencies only when it is selected,
+# so switching tools and cold starts don't pay for the others.
+timer = StartupTimer(started=_script_start)
 
 # Fix for Windows Event Loop Policy
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-# Ensure Playwright browsers are installed (for Streamlit Cloud)
-import subprocess
-try:
-    # Check if we can run playwright
-    subprocess.run(["playwright", "--version"], check=True)
-except (FileNotFoundError, subprocess.CalledProcessError):
-    # If not found or error, try to install
-    # Note: This might need to be 'python -m playwright install chromium'
-    pass
-
-# Install chromium if not already present (brute force check for cloud)
-if not os.path.exists("playwright_installed.flag"):
-    with st.spinner("Installing Playwright browsers... (this runs once)"):
-        subprocess.run([sys.executable, "-m", "playwright", "install", "chromium"])
-        # Create a flag file to avoid re-running
-        with open("playwright_installed.flag", "w") as f:
-            f.write("installed")
-
 # Page Config
 st.set_page_config(page_title="Kohler Automation", layout="wide")
 
 # Sidebar Navigation
 st.sidebar.title("Navigation")
 page = st.sidebar.radio("Select Tool", ["Kohler Scraper", "Folder Scanner", "PDF Highlighter"])
+timer.mark("Sidebar ready")
+# Filled in at the end of the run with the startup-time report
+startup_report = st.sidebar.expander("Startup time").empty()
+
+
+# Exported downloads, built once per result and format; shared by the Kohler and Folder Scanner pages
+@st.cache_resource
+def get_export_cache():
+    from export import ExportCache
+    return ExportCache()
+
+
+def poll_again():
+    # Redraw in a second to show a background job's progress
+    startup_report.markdown(timer.report())
+    time.sleep(1)
+    st.rerun()
+
 
 if page == "Kohler Scraper":
     st.title("Kohler Product Scraper")
     st.markdown("Enter product codes below (one per line) to scrape data from Kohler.com.")
 
+    with timer.step("Import scraper (pandas, Playwright)"):
+        import pandas as pd
+        from scrape_kohler import iter_process_codes, DEFAULT_CONCURRENCY, RESULT_COLUMNS
+        from jobs import JobManager, QUEUED, RUNNING, DONE, CANCELLED
+        from browser_pool import SharedBrowser
+        from result_cache import DEFAULT_TTL_HOURS
+        from export import available_formats, MIME_TYPES
+
+    # Ensure Playwright browsers are installed (for Streamlit Cloud).
+    # Runs once per process; the marker file makes it a no-op on later restarts of the same deployment.
+    @st.cache_resource(show_spinner="Installing Playwright browsers... (this runs once)")
+    def playwright_ready():
+        return ensure_playwright_browsers()
+
+    with timer.step("Playwright browser check"):
+        playwright_ready()
+
     # Input Area
     input_text = st.text_area("Product Codes", height=200, placeholder="K-23475-4-AF\nK-77748T-4-0")
+    concurrency = st.number_input("Parallel browser pages", min_value=1, max_value=8, value=DEFAULT_CONCURRENCY)
+    col_c1, col_c2 = st.columns(2)
+    with col_c1:
+        cache_ttl_hours = st.number_input("Reuse cached results younger than (hours)", min_value=0.0, value=float(DEFAULT_TTL_HOURS))
+    with col_c2:
+        force_refresh = st.checkbox("Force refresh (ignore cached results)", value=False)
+
+    # One job queue for the whole server process, shared by all sessions.
+    # A single worker runs scrape jobs one at a time so concurrent users don't starve each other.
+    @st.cache_resource
+    def get_job_manager():
+        return JobManager(workers=1)
+
+    # Warm Chromium kept across reruns and sessions; each job opens fresh contexts on it
+    @st.cache_resource
+    def get_shared_browser():
+        return SharedBrowser()
+
+    job_manager = get_job_manager()
+    shared_browser = get_shared_browser()
 
     if st.button("Run Scraper"):
         if not input_text.strip():
@@ -56,39 +89,70 @@ if page == "Kohler Scraper":
         else:
             # Parse input
             codes = [line.strip() for line in input_text.split('\n') if line.strip()]
-            
-            st.info(f"Processing {len(codes)} codes...")
-            
-            # Run Scraper
-            try:
-                with st.spinner('Scraping in progress... This may take a while.'):
-                    result_df = process_codes(codes)
-                
-                st.success("Scraping Completed!")
-                
-                # Display Results
-                st.dataframe(result_df)
-                
-                # Download Button
-                # Convert DF to Excel in memory
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    result_df.to_excel(writer, index=False)
-                output.seek(0)
-                
-                st.download_button(
-                    label="Download Results (Excel)",
-                    data=output,
-                    file_name="kohler_results.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-                
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
+
+            def run_scrape(job, codes=codes, concurrency=int(concurrency), force_refresh=force_refresh,
+                           cache_ttl_hours=cache_ttl_hours):
+                for index, row in iter_process_codes(
+                    codes,
+                    concurrency=concurrency,
+                    force_refresh=force_refresh,
+                    cache_ttl_hours=cache_ttl_hours,
+                    cancel_event=job.cancel_event,
+                    shared_browser=shared_browser,
+                ):
+                    job.add_row(index, row)
+
+            job = job_manager.submit(f"{len(codes)} codes", run_scrape, total=len(codes))
+            st.session_state['scrape_job_id'] = job.id
+
+    job = job_manager.get(st.session_state.get('scrape_job_id'))
+    if job:
+        # Display Results (partial while the job is running)
+        if job.status == QUEUED:
+            st.info(f"Queued ({job_manager.position(job)} job(s) ahead)...")
+        elif job.status == RUNNING:
+            st.info(f"Scraping in progress: {job.done}/{job.total} codes done.")
+        elif job.status == DONE:
+            st.success("Scraping Completed!")
+        elif job.status == CANCELLED:
+            st.warning(f"Scraping cancelled after {job.done}/{job.total} codes.")
+        else:
+            st.error(f"An error occurred: {job.error}")
+
+        st.progress(job.progress)
+        result_df = pd.DataFrame(job.rows(), columns=RESULT_COLUMNS)
+        st.dataframe(result_df)
+
+        if job.active:
+            st.button("Cancel", on_click=job.cancel)
+            # Poll the job and redraw with whatever rows have arrived
+            poll_again()
+        elif not result_df.empty:
+            # The file is only written when the button is clicked, then reused for this job
+            export_format = st.selectbox("Download format", available_formats(), key="kohler_export_format")
+            st.download_button(
+                label="Download Results",
+                data=get_export_cache().download(f"kohler-{job.id}", result_df, export_format),
+                file_name=f"kohler_results.{export_format}",
+                mime=MIME_TYPES[export_format]
+            )
 
 elif page == "Folder Scanner":
     st.title("Folder Scanner")
-    st.title("Folder Scanner")
+
+    with timer.step("Import scanner (pandas, tkinter)"):
+        import pandas as pd
+        from folder_scan import FolderScanner
+        from file_index import FileIndex
+        from duplicates import DuplicateFinder
+        from export import available_formats, write_dataframe, MIME_TYPES
+        from jobs import JobManager, QUEUED, RUNNING, DONE, CANCELLED
+        try:
+            import tkinter as tk
+            from tkinter import filedialog
+            TKINTER_AVAILABLE = True
+        except ImportError:
+            TKINTER_AVAILABLE = False
     
     if not TKINTER_AVAILABLE:
         st.info("Web Mode: Upload files to list them (Browser security prevents direct folder scanning).")
@@ -104,6 +168,7 @@ elif page == "Folder Scanner":
                 })
             
             st.session_state['scan_df'] = pd.DataFrame(file_data)
+            st.session_state['scan_df_version'] = "upload-" + "-".join(f.file_id for f in uploaded_files)
             st.success(f"Processed {len(uploaded_files)} files.")
         else:
             st.session_state['scan_df'] = None
@@ -138,11 +203,12 @@ elif page == "Folder Scanner":
                 file_path = filedialog.asksaveasfilename(
                     master=root,
                     defaultextension=".xlsx",
-                    filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+                    filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("Parquet files", "*.parquet")]
                 )
                 root.destroy()
                 if file_path:
-                    st.session_state['scan_df'].to_excel(file_path, index=False)
+                    # Format follows the chosen extension
+                    write_dataframe(st.session_state['scan_df'], file_path)
                     st.session_state['save_message'] = {"type": "success", "text": f"Saved to {file_path}"}
             except Exception as e:
                 st.session_state['save_message'] = {"type": "error", "text": f"Could not save file: {e}"}
@@ -159,6 +225,29 @@ elif page == "Folder Scanner":
         st.write("")
         st.button("Browse Folder", on_click=browse_callback)
 
+    # Scans run as background jobs so the page can show progress and a Cancel button
+    @st.cache_resource
+    def get_scan_job_manager():
+        return JobManager(workers=2)
+
+    scan_jobs = get_scan_job_manager()
+
+    incremental = st.checkbox(
+        "Only re-list folders that changed since the last scan", value=True,
+        help="Much faster on large shares. Files edited in place (same name, same folder) are only "
+             "detected by a full scan.",
+    )
+
+    def run_scan(job, scanner, outcome):
+        # Runs on the scan job thread: reuse the last scan of this folder, then store this one
+        file_index = FileIndex()
+        # A second scan of the same folder waits for the first and builds on it
+        with file_index.root_lock(scanner.root):
+            if incremental:
+                scanner.previous = file_index.previous_scan(scanner.root)
+            if scanner.run(job.cancel_event):
+                outcome['changes'] = file_index.record_scan(scanner)
+
     if st.button("Scan Folder"):
         # Use the value from the text input
         target_path = st.session_state['path_input']
@@ -166,33 +255,66 @@ elif page == "Folder Scanner":
         if not target_path or not os.path.isdir(target_path):
             st.error(f"Please enter a valid directory path. Invalid path: '{target_path}'")
         else:
-            file_data = []
-            try:
-                with st.spinner(f"Scanning {target_path}..."):
-                    for root, dirs, files in os.walk(target_path):
-                        for file in files:
-                            full_path = os.path.join(root, file)
-                            file_data.append({"File Name": file, "File Path": full_path})
-                
-                if not file_data:
-                    st.warning("No files found in the selected directory.")
-                    st.session_state['scan_df'] = None
-                else:
-                    df = pd.DataFrame(file_data)
-                    st.session_state['scan_df'] = df
-                    st.success(f"Found {len(df)} files!")
-                    
-                    # Clear previous save messages
-                    if 'save_message' in st.session_state:
-                        del st.session_state['save_message']
+            scanner = FolderScanner(target_path)
+            outcome = {}
+            job = scan_jobs.submit(f"Scan {target_path}",
+                                   lambda job, scanner=scanner, outcome=outcome: run_scan(job, scanner, outcome))
+            st.session_state['folder_scan'] = (job.id, scanner, outcome)
+            st.session_state['scan_df'] = None
+            st.session_state.pop('duplicate_scan', None)
 
-            except Exception as e:
-                st.error(f"An error occurred during scanning: {e}")
+            # Clear previous save messages
+            if 'save_message' in st.session_state:
+                del st.session_state['save_message']
+
+    scan_job_id, scanner, scan_outcome = st.session_state.get('folder_scan', (None, None, None))
+    scan_job = scan_jobs.get(scan_job_id)
+    if scan_job:
+        if scan_job.status == QUEUED:
+            st.info(f"Queued ({scan_jobs.position(scan_job)} scan(s) ahead)...")
+        elif scan_job.status == RUNNING:
+            st.info(f"Scanning {scanner.root}: {scanner.progress_text()}")
+        elif scan_job.status == DONE:
+            st.success(f"Scan finished: {scanner.progress_text()}")
+        elif scan_job.status == CANCELLED:
+            st.warning(f"Scan cancelled: {scanner.progress_text()}")
+        else:
+            st.error(f"An error occurred during scanning: {scan_job.error}")
+
+        if scan_job.active:
+            st.button("Cancel Scan", on_click=scan_job.cancel)
+            # Poll the scan and redraw the counters
+            poll_again()
+        elif st.session_state.get('scan_df_job') != scan_job.id:
+            # Build the table once per finished scan (partial if it was cancelled)
+            st.session_state['scan_df_job'] = scan_job.id
+            df = scanner.dataframe()
+            if df.empty:
+                st.warning("No files found in the selected directory.")
                 st.session_state['scan_df'] = None
+            else:
+                st.session_state['scan_df'] = df
+                st.session_state['scan_df_version'] = f"scan-{scan_job.id}"
+
+        if scan_job.status == DONE:
+            changes = scan_outcome.get('changes')
+            if changes is None:
+                st.caption("First scan of this folder: the next scan will list what changed.")
+            elif changes.empty:
+                st.caption("No files added, removed or modified since the last scan.")
+            else:
+                counts = changes['Change'].value_counts()
+                st.subheader("Changes since the last scan")
+                st.write(", ".join(f"{count:,} {change.lower()}" for change, count in counts.items()))
+                st.dataframe(changes.head(10_000))
 
     # Display Results if available
     if st.session_state['scan_df'] is not None:
-        st.dataframe(st.session_state['scan_df'])
+        # Only a preview goes to the browser; downloads have every row
+        preview_rows = 10_000
+        if len(st.session_state['scan_df']) > preview_rows:
+            st.caption(f"Showing the first {preview_rows:,} of {len(st.session_state['scan_df']):,} files.")
+        st.dataframe(st.session_state['scan_df'].head(preview_rows))
         
         # Display save message if exists
         if 'save_message' in st.session_state:
@@ -205,31 +327,81 @@ elif page == "Folder Scanner":
         col_d1, col_d2 = st.columns(2)
         
         with col_d1:
-            # Download Button (Browser)
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                st.session_state['scan_df'].to_excel(writer, index=False)
-            output.seek(0)
-            
+            # Download Button (Browser): written on click, once per scan and format
+            export_format = st.selectbox("Download format", available_formats(), key="scan_export_format")
             st.download_button(
                 label="Download Results (Browser)",
-                data=output,
-                file_name="folder_scan_results.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                data=get_export_cache().download(st.session_state['scan_df_version'],
+                                                 st.session_state['scan_df'], export_format),
+                file_name=f"folder_scan_results.{export_format}",
+                mime=MIME_TYPES[export_format]
             )
-        
+
         with col_d2:
             # Save As Button (Native)
             if TKINTER_AVAILABLE:
                 st.button("Save to File... (Native)", on_click=save_as_callback)
 
+        # Duplicates need real paths to read, so not in web (upload) mode
+        if 'File Path' in st.session_state['scan_df'].columns:
+            st.subheader("Duplicate Files")
+            st.caption("Files are only read when their size matches another file's: first both ends, "
+                       "then the whole file if those still match.")
+            if st.button("Find Duplicates"):
+                finder = DuplicateFinder(st.session_state['scan_df'])
+                job = scan_jobs.submit("Find duplicates", lambda job, finder=finder: finder.run(job.cancel_event))
+                st.session_state['duplicate_scan'] = (job.id, finder, st.session_state['scan_df_version'])
+
+            dup_job_id, finder, dup_version = st.session_state.get('duplicate_scan', (None, None, None))
+            # Results of a search over an earlier file list don't belong under this one
+            dup_job = scan_jobs.get(dup_job_id) if dup_version == st.session_state['scan_df_version'] else None
+            if dup_job:
+                if dup_job.active:
+                    if dup_job.status == QUEUED:
+                        st.info(f"Queued ({scan_jobs.position(dup_job)} job(s) ahead)...")
+                    else:
+                        st.info(f"Looking for duplicates. {finder.progress_text()}")
+                    st.button("Cancel", on_click=dup_job.cancel, key="cancel_duplicates")
+                    # Poll until the search starts and finishes
+                    poll_again()
+                elif dup_job.status == CANCELLED:
+                    st.warning("Duplicate search cancelled.")
+                elif dup_job.status == DONE:
+                    groups = finder.groups
+                    if groups.empty:
+                        st.success("No duplicate files found.")
+                    else:
+                        st.success(f"{groups['Group'].nunique():,} groups of identical files "
+                                   f"({len(groups):,} files). Keeping one file per group would free "
+                                   f"{finder.reclaimable_bytes / 2 ** 20:,.1f} MB.")
+                        st.dataframe(groups.head(10_000))
+                        st.download_button(
+                            label="Download Duplicate List",
+                            data=get_export_cache().download(f"duplicates-{dup_job.id}", groups, export_format),
+                            file_name=f"duplicate_files.{export_format}",
+                            mime=MIME_TYPES[export_format]
+                        )
+                    st.caption(" → ".join(f"{stage}: {count:,}" for stage, count in finder.stage_counts.items())
+                               + (f" ({finder.errors} unreadable)" if finder.errors else ""))
+                else:
+                    st.error(f"An error occurred while looking for duplicates: {dup_job.error}")
+
 elif page == "PDF Highlighter":
     st.title("PDF Highlighter")
     st.markdown("Search and highlight text in PDF files (supports scanned PDFs via OCR).")
 
-    import fitz  # PyMuPDF
-    import pytesseract
-    from PIL import Image
+    with timer.step("Import PDF tools (PyMuPDF, Tesseract)"):
+        import io
+        import hashlib
+        import fitz  # PyMuPDF
+        import pandas as pd
+        import pytesseract
+        from pdf_ocr import (
+            ocr_document, iter_ocr_document, embed_text_layer, spill_to_temp,
+            ADAPTIVE_START_DPI, ADAPTIVE_MAX_DPI, DEFAULT_MEMORY_LIMIT_MB,
+        )
+        from ocr_cache import OcrCache
+        from word_index import WordIndex, OCR
 
     # Set Tesseract Path explicitly
     # Set Tesseract Path explicitly if on Windows and path exists
@@ -240,139 +412,182 @@ elif page == "PDF Highlighter":
 
     # File Uploader
     uploaded_file = st.file_uploader("Upload PDF", type=["pdf"])
-    search_text = st.text_input("Text to Search & Highlight")
+    search_text = st.text_area("Text to Search & Highlight", help="One word or phrase per line.")
     enable_ocr = st.checkbox("Enable OCR (for scanned files)", value=False)
+    ocr_all_pages = st.checkbox(
+        "OCR every page", value=False, disabled=not enable_ocr,
+        help="By default only pages with scanned images and no text layer are OCR'd.",
+    )
+    embed_ocr_text = st.checkbox(
+        "Make scanned pages searchable", value=False, disabled=not enable_ocr,
+        help="Writes the OCR text into the downloaded PDF as an invisible layer, so it never needs OCR again.",
+    )
+    streaming = st.checkbox(
+        "Streaming mode (very large PDFs)", value=False,
+        help="Reads the PDF from disk and OCRs/highlights a few pages at a time within a memory limit.",
+    )
+    memory_limit_mb = st.number_input(
+        "Memory limit (MB)", min_value=256, value=int(DEFAULT_MEMORY_LIMIT_MB), step=256, disabled=not streaming,
+        help="For this PDF's OCR workers and their Tesseract runs; the rest of the app isn't counted.",
+    )
 
 
-    # Helper function for single page OCR
-    def process_page_ocr(page_num, pdf_bytes, dpi=200):
-        try:
-            # Re-open doc in thread to avoid conflicts
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            page = doc[page_num]
-            
-            # Render page to image (lower DPI for speed, 200 is usually enough for text)
-            pix = page.get_pixmap(dpi=dpi)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Convert to grayscale to speed up OCR
-            img = img.convert('L')
-            
-            # Get OCR data
-            ocr_data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
-            
-            return {
-                "page_num": page_num,
-                "ocr_data": ocr_data,
-                "width": pix.width,
-                "height": pix.height,
-                "rect_width": page.rect.width,
-                "rect_height": page.rect.height
-            }
-        except Exception as e:
-            return {"page_num": page_num, "error": str(e)}
-
-    # Cached function to run OCR in parallel
-    @st.cache_data(show_spinner=False)
-    def get_ocr_data(pdf_bytes, dpi=200):
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        num_pages = len(doc)
-        doc.close()
-        
-        results = []
-        # Use ThreadPoolExecutor for I/O bound tasks (OCR is CPU bound but Tesseract is external process)
-        # Adjust max_workers if needed, default is usually fine
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_page = {
-                executor.submit(process_page_ocr, i, pdf_bytes, dpi): i 
-                for i in range(num_pages)
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_page):
-                results.append(future.result())
-                
-        results.sort(key=lambda x: x["page_num"])
-        return results
+    # One on-disk OCR cache shared by every session (per page, survives restarts)
+    @st.cache_resource
+    def get_ocr_cache():
+        return OcrCache()
+
+    def get_ocr_data(pdf_bytes, selective=True):
+        # Pages are OCR'd on a process pool (one document handle per worker), see pdf_ocr.py.
+        # Start at a low DPI and only re-render pages Tesseract wasn't confident about.
+        return ocr_document(pdf_bytes, dpi=ADAPTIVE_START_DPI, max_dpi=ADAPTIVE_MAX_DPI,
+                            selective=selective, cache=get_ocr_cache())
+
+    def get_word_index(pdf_bytes, pdf_document, use_ocr, selective):
+        """
+        Word index of the uploaded document, built once and reused for every query on it
+        in this session. Returns (index, ocr_results).
+        """
+        doc_key = (hashlib.sha256(pdf_bytes).hexdigest(), use_ocr, selective)
+        cached = st.session_state.get("word_index")
+        if cached and cached[0] == doc_key:
+            return cached[1], cached[2]
+
+        ocr_results = []
+        if use_ocr:
+            with st.spinner("Running OCR (Cached)..."):
+                ocr_results = get_ocr_data(pdf_bytes, selective=selective)
+        index = WordIndex.from_document(pdf_document, ocr_results)
+        # Don't keep an index with failed OCR pages, so the next run tries them again
+        if not any("error" in res for res in ocr_results):
+            st.session_state["word_index"] = (doc_key, index, ocr_results)
+        return index, ocr_results
+
+    def highlight_index(pdf_document, index, term_counts):
+        """
+        Highlights every match of the search terms found in `index`. Returns the number of matches.
+        """
+        total = 0
+        for term, matches in index.search(search_terms).items():
+            term_counts[term] = term_counts.get(term, 0) + len(matches)
+            for page_num, rects in matches:
+                # One annotation per match with one quad per line; add_highlight_annot
+                # already builds the appearance, so no extra update() per annotation
+                pdf_document[page_num].add_highlight_annot(rects)
+                total += 1
+        return total
+
+    def process_streaming(pdf_path, pdf_document, term_counts):
+        """
+        Streaming mode: each page is indexed, highlighted (and given its text layer) as soon
+        as its OCR result arrives, then dropped. Returns (matches, embedded words, OCR'd pages).
+        """
+        total = embedded = 0
+        done = set()
+        progress = st.progress(0.0, text="Processing pages...")
 
-    if uploaded_file and search_text:
+        def fold(page_num, res=None):
+            nonlocal total, embedded
+            index = WordIndex()
+            index.add_page(pdf_document[page_num], res)
+            total += highlight_index(pdf_document, index, term_counts)
+            if embed_ocr_text:
+                embedded += embed_text_layer(pdf_document, index.words(OCR))
+            done.add(page_num)
+            progress.progress(len(done) / len(pdf_document), text=f"Processed {len(done)} of {len(pdf_document)} pages")
+
+        ocr_pages = 0
+        if enable_ocr:
+            for res in iter_ocr_document(pdf_path, dpi=ADAPTIVE_START_DPI, max_dpi=ADAPTIVE_MAX_DPI,
+                                         selective=not ocr_all_pages, cache=get_ocr_cache(),
+                                         memory_limit_mb=memory_limit_mb):
+                ocr_pages += 1
+                if "error" in res:
+                    st.warning(f"OCR failed on page {res['page_num'] + 1}: {res['error']}")
+                fold(res["page_num"], res)
+        # Pages that needed no OCR
+        for page_num in range(len(pdf_document)):
+            if page_num not in done:
+                fold(page_num)
+        return total, embedded, ocr_pages
+
+    search_terms = [line.strip() for line in search_text.splitlines() if line.strip()]
+
+    if uploaded_file and search_terms:
         if st.button("Process PDF"):
             try:
                 with st.spinner("Processing PDF..."):
-                    # Open PDF from memory for highlighting
-                    pdf_bytes = uploaded_file.getvalue()
-                    pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-                    total_matches = 0
-                    
-                    # 1. Standard Text Search
-                    for page in pdf_document:
-                        text_instances = page.search_for(search_text)
-                        for inst in text_instances:
-                            highlight = page.add_highlight_annot(inst)
-                            highlight.update()
-                            total_matches += 1
-                    
-                    # 2. OCR Search (if enabled)
-                    if enable_ocr:
-                        try:
-                            with st.spinner("Running OCR (Cached)..."):
-                                # Get cached OCR data
-                                ocr_results = get_ocr_data(pdf_bytes, dpi=200)
-                                
+                    term_counts = {}
+                    embedded_words = 0
+                    temp_paths = []
+                    pdf_document = None
+                    try:
+                        if streaming:
+                            # Work from a copy on disk instead of the uploaded bytes
+                            pdf_path = spill_to_temp(uploaded_file)
+                            temp_paths.append(pdf_path)
+                            pdf_document = fitz.open(pdf_path)
+                            total_matches, embedded_words, ocr_pages = process_streaming(pdf_path, pdf_document, term_counts)
+                            if enable_ocr:
+                                st.caption(f"OCR ran on {ocr_pages} of {len(pdf_document)} pages.")
+                        else:
+                            # Open PDF from memory for highlighting
+                            pdf_bytes = uploaded_file.getvalue()
+                            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+                            # Native text layer + OCR words (if enabled) in one index
+                            index, ocr_results = get_word_index(pdf_bytes, pdf_document, enable_ocr, not ocr_all_pages)
+                            if enable_ocr:
+                                st.caption(f"OCR ran on {len(ocr_results)} of {len(pdf_document)} pages.")
                                 for res in ocr_results:
                                     if "error" in res:
                                         st.warning(f"OCR failed on page {res['page_num'] + 1}: {res['error']}")
-                                        continue
-                                        
-                                    page_num = res["page_num"]
-                                    ocr_data = res["ocr_data"]
-                                    pix_width = res["width"]
-                                    pix_height = res["height"]
-                                    page_rect_width = res["rect_width"]
-                                    page_rect_height = res["rect_height"]
-                                    
-                                    page = pdf_document[page_num]
-                                    
-                                    n_boxes = len(ocr_data['text'])
-                                    for i in range(n_boxes):
-                                        if search_text.lower() in ocr_data['text'][i].lower():
-                                            (x, y, w, h) = (ocr_data['left'][i], ocr_data['top'][i], ocr_data['width'][i], ocr_data['height'][i])
-                                            
-                                            # Scale coordinates
-                                            scale_x = page_rect_width / pix_width
-                                            scale_y = page_rect_height / pix_height
-                                            
-                                            pdf_rect = fitz.Rect(
-                                                x * scale_x, 
-                                                y * scale_y, 
-                                                (x + w) * scale_x, 
-                                                (y + h) * scale_y
-                                            )
-                                            
-                                            highlight = page.add_highlight_annot(pdf_rect)
-                                            highlight.update()
-                                            total_matches += 1
-                                            
-                        except pytesseract.TesseractNotFoundError:
-                            st.error("Tesseract OCR is not found. Please install Tesseract.")
-                        except Exception as e:
-                            st.error(f"OCR Error: {e}")
-
-                    if total_matches > 0:
-                        st.success(f"Found and highlighted {total_matches} occurrences.")
-                        
-                        # Save to buffer
-                        output_pdf = io.BytesIO()
-                        pdf_document.save(output_pdf)
-                        output_pdf.seek(0)
-                        
-                        st.download_button(
-                            label="Download Highlighted PDF",
-                            data=output_pdf,
-                            file_name=f"highlighted_{uploaded_file.name}",
-                            mime="application/pdf"
-                        )
-                    else:
-                        st.warning("No matches found.")
-                        
+
+                            total_matches = highlight_index(pdf_document, index, term_counts)
+
+                            if enable_ocr and embed_ocr_text:
+                                embedded_words = embed_text_layer(pdf_document, index.words(OCR))
+
+                        if embedded_words:
+                            st.caption(f"Embedded {embedded_words} OCR words as a searchable text layer.")
+
+                        if total_matches > 0:
+                            st.success(f"Found and highlighted {total_matches} occurrences.")
+                            if len(search_terms) > 1:
+                                st.table(pd.DataFrame(list(term_counts.items()), columns=["Term", "Matches"]))
+                        else:
+                            st.warning("No matches found.")
+
+                        if total_matches > 0 or embedded_words > 0:
+                            if streaming:
+                                # Write the result to disk rather than building it up in a BytesIO
+                                output_path = pdf_path + ".out.pdf"
+                                temp_paths.append(output_path)
+                                pdf_document.save(output_path)
+                                with open(output_path, "rb") as f:
+                                    output_pdf = f.read()
+                            else:
+                                # Save to buffer
+                                output_pdf = io.BytesIO()
+                                pdf_document.save(output_pdf)
+                                output_pdf.seek(0)
+
+                            st.download_button(
+                                label="Download Highlighted PDF",
+                                data=output_pdf,
+                                file_name=f"highlighted_{uploaded_file.name}",
+                                mime="application/pdf"
+                            )
+                    finally:
+                        # The temp files can only be removed once the document is closed (Windows)
+                        if streaming and pdf_document is not None:
+                            pdf_document.close()
+                        for path in temp_paths:
+                            if os.path.exists(path):
+                                os.remove(path)
+
             except Exception as e:
                 st.error(f"An error occurred: {e}")
+
+# Startup-time report for this run
+startup_report.markdown(timer.report())
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+# Relaunch Chromium after this many jobs to keep its memory use bounded
+DEFAULT_MAX_JOBS = 50
+
+
+class SharedBrowser:
+    """
+    One long-lived headless Chromium shared by all scrape jobs in the process.
+
+    Playwright objects belong to the event loop that created them, so the browser lives on
+    its own loop thread and jobs are submitted to it with `submit()`. Jobs borrow the browser
+    with `borrow()` and open their own contexts on it. The browser is relaunched if it has
+    crashed/disconnected, and recycled once `max_jobs` jobs have used it and none is running.
+    """
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, headless=True):
+        self.max_jobs = max_jobs
+        self.headless = headless
+        self.launches = 0
+        self._jobs_served = 0
+        self._active = 0
+        self._playwright = None
+        self._browser = None
+        self._loop = asyncio.new_event_loop()
+        self._lock = None
+        self._thread = threading.Thread(target=self._loop.run_forever, name="shared-browser", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """
+        Schedules `coro` on the browser's event loop (from any thread) and returns a
+        concurrent.futures.Future for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    @asynccontextmanager
+    async def borrow(self):
+        """
+        Yields the running browser for one job. Must be used from coroutines passed to `submit()`.
+        """
+        browser = await self._acquire()
+        try:
+            yield browser
+        finally:
+            await self._release()
+
+    def is_healthy(self):
+        return self._browser is not None and self._browser.is_connected()
+
+    def close(self):
+        self.submit(self._shutdown()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _get_lock(self):
+        # Created lazily so it is bound to the browser loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _acquire(self):
+        async with self._get_lock():
+            if self._browser is not None and not self.is_healthy():
+                print("Shared browser is not responding, relaunching...")
+                await self._shutdown()
+            if self._browser is None:
+                await self._launch()
+            self._active += 1
+            self._jobs_served += 1
+            return self._browser
+
+    async def _release(self):
+        async with self._get_lock():
+            self._active -= 1
+            if self._active == 0 and self._jobs_served >= self.max_jobs:
+                print(f"Recycling shared browser after {self._jobs_served} jobs.")
+                await self._shutdown()
+
+    async def _launch(self):
+        self._playwright = await async_playwright().start()
+        try:
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        except Exception:
+            # e.g. browsers not installed: stop the driver so the next attempt doesn't leak it
+            await self._shutdown()
+            raise
+        self._jobs_served = 0
+        self.launches += 1
+        print(f"Shared browser launched (launch #{self.launches}).")
+
+    async def _shutdown(self):
+        browser, playwright = self._browser, self._playwright
+        self._browser = None
+        self._playwright = None
+        for closer in (browser and browser.close, playwright and playwright.stop):
+            if closer:
+                try:
+                    await closer()
+                except Exception as e:
+                    # Already dead (crashed browser or driver); nothing left to clean up
+                    print(f"Error shutting down shared browser: {e}")
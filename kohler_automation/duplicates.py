@@ -0,0 +1,153 @@
+import concurrent.futures
+import hashlib
+import os
+import threading
+import pandas as pd
+
+# Bytes read from each end of a file for the partial hash
+PARTIAL_BLOCK = 64 * 1024
+# Files hashed at once: bounds the parallel reads hitting the disk or share
+DEFAULT_HASH_WORKERS = int(os.environ.get("KOHLER_HASH_WORKERS", 4))
+READ_CHUNK = 1024 * 1024
+
+DUPLICATE_COLUMNS = ["Group", "File Path", "Size (Bytes)", "Hash"]
+
+
+def partial_hash(path, size, block=PARTIAL_BLOCK):
+    """
+    Hash of the first and last `block` bytes. For files up to 2 x block this covers the whole file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(block))
+        if size > block:
+            f.seek(max(block, size - block))
+            digest.update(f.read(block))
+    return digest.hexdigest()
+
+
+def full_hash(path, cancel_event=None):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _colliding(df, keys):
+    # Rows whose key columns are shared with at least one other row
+    return df[df.duplicated(keys, keep=False)]
+
+
+class DuplicateFinder:
+    """
+    Finds duplicate files in a Folder Scanner result (File Path, Size (Bytes)) in three stages,
+    each only looking at the files the previous one could not tell apart:
+    1. same size, 2. same hash of the first and last blocks, 3. same full-content hash.
+    Hashing runs on `workers` threads. Progress can be read while run() works.
+    """
+
+    def __init__(self, files, workers=DEFAULT_HASH_WORKERS, min_size=1):
+        self.files = files[["File Path", "Size (Bytes)"]]
+        self.workers = workers
+        self.min_size = min_size
+        self.stage = "Waiting"
+        self.checked = 0
+        self.to_check = 0
+        self.bytes_hashed = 0
+        self.errors = 0
+        self.stage_counts = {}
+        self.groups = pd.DataFrame(columns=DUPLICATE_COLUMNS)
+        self._lock = threading.Lock()
+
+    def progress_text(self):
+        return f"{self.stage}: {self.checked:,}/{self.to_check:,} files ({self.bytes_hashed / 2 ** 20:,.0f} MB read)"
+
+    @property
+    def reclaimable_bytes(self):
+        """
+        Space freed by keeping one file per group.
+        """
+        if self.groups.empty:
+            return 0
+        sizes = self.groups.groupby("Group")["Size (Bytes)"].agg(["first", "count"])
+        return int((sizes["first"] * (sizes["count"] - 1)).sum())
+
+    def _hash_all(self, stage, df, hash_file, cancel_event):
+        """
+        Runs hash_file(path, size) over the rows of df in parallel. Returns df with a "Hash"
+        column, minus unreadable files; None if cancelled.
+        """
+        self.stage, self.checked, self.to_check = stage, 0, len(df)
+        hashes = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash") as pool:
+            futures = {
+                pool.submit(hash_file, path, size): (i, size)
+                for i, path, size in zip(df.index, df["File Path"], df["Size (Bytes)"])
+            }
+            for future in concurrent.futures.as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    return None
+                i, size = futures[future]
+                try:
+                    hashes[i] = future.result()
+                except OSError:
+                    with self._lock:
+                        self.errors += 1
+                self.checked += 1
+        df = df.loc[list(hashes)].copy()
+        df["Hash"] = pd.Series(hashes)
+        return df
+
+    def _partial(self, path, size):
+        value = partial_hash(path, size)
+        with self._lock:
+            self.bytes_hashed += min(size, 2 * PARTIAL_BLOCK)
+        return value
+
+    def _full(self, path, size, cancel_event=None):
+        value = full_hash(path, cancel_event)
+        with self._lock:
+            self.bytes_hashed += size
+        return value
+
+    def run(self, cancel_event=None):
+        """
+        Finds the duplicate groups (see `groups`). Returns True if it finished, False if cancelled.
+        """
+        # 1. Only files sharing their size with another file can be duplicates
+        self.stage = "Grouping by size"
+        candidates = _colliding(self.files[self.files["Size (Bytes)"] >= self.min_size], ["Size (Bytes)"])
+        self.stage_counts["Same size"] = len(candidates)
+
+        # 2. Cheap partial hash of both ends
+        candidates = self._hash_all("Partial hash", candidates, self._partial, cancel_event)
+        if candidates is None:
+            return False
+        candidates = _colliding(candidates, ["Size (Bytes)", "Hash"])
+        self.stage_counts["Same size and partial hash"] = len(candidates)
+
+        # 3. Full hash, only for files the partial hash didn't already cover completely
+        small = candidates[candidates["Size (Bytes)"] <= 2 * PARTIAL_BLOCK]
+        large = candidates[candidates["Size (Bytes)"] > 2 * PARTIAL_BLOCK].drop(columns="Hash")
+        large = self._hash_all(
+            "Full hash", large, lambda path, size: self._full(path, size, cancel_event), cancel_event
+        )
+        if large is None or (cancel_event is not None and cancel_event.is_set()):
+            return False
+        duplicates = _colliding(pd.concat([small, large]), ["Size (Bytes)", "Hash"])
+        self.stage_counts["Identical content"] = len(duplicates)
+
+        # Largest groups (by space they waste) first
+        group_sizes = duplicates.groupby(["Size (Bytes)", "Hash"])["File Path"].transform("size")
+        duplicates["Wasted"] = duplicates["Size (Bytes)"] * (group_sizes - 1)
+        duplicates = duplicates.sort_values(["Wasted", "Size (Bytes)", "Hash", "File Path"],
+                                            ascending=[False, False, True, True])
+        duplicates["Group"] = duplicates.groupby(["Size (Bytes)", "Hash"], sort=False).ngroup() + 1
+        self.groups = duplicates[DUPLICATE_COLUMNS].reset_index(drop=True)
+        self.stage = "Done"
+        return True
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from openpyxl import Workbook
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Rows per sheet, header included; longer results continue on "Results 2", "Results 3", ...
+EXCEL_MAX_ROWS = 1_048_576
+# Rows converted to plain Python values at a time while streaming to the workbook
+EXCEL_BATCH_ROWS = 50_000
+# Exports kept on disk by ExportCache
+DEFAULT_CACHED_EXPORTS = 8
+
+MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def available_formats():
+    """
+    Export formats that can be written here (Parquet needs pyarrow).
+    """
+    return ["xlsx", "csv"] + (["parquet"] if pyarrow is not None else [])
+
+
+def format_for(path):
+    fmt = os.path.splitext(path)[1].lower().lstrip(".")
+    return fmt if fmt in MIME_TYPES else "xlsx"
+
+
+def _cell_values(df):
+    # openpyxl doesn't know NaN/NaT/pd.NA: write them as empty cells
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def write_xlsx(df, target, sheet_name="Results", max_rows=EXCEL_MAX_ROWS):
+    """
+    Writes df with openpyxl's write-only workbook, which streams rows to the file instead of
+    building every cell in memory. Starts a new sheet every `max_rows` rows.
+    `target` is a path or a binary file object.
+    """
+    workbook = Workbook(write_only=True)
+    per_sheet = max_rows - 1
+    for sheet_no, start in enumerate(range(0, max(len(df), 1), per_sheet), 1):
+        sheet = workbook.create_sheet(sheet_name if sheet_no == 1 else f"{sheet_name} {sheet_no}")
+        sheet.append([str(column) for column in df.columns])
+        end = min(start + per_sheet, len(df))
+        for batch in range(start, end, EXCEL_BATCH_ROWS):
+            for row in _cell_values(df.iloc[batch:min(batch + EXCEL_BATCH_ROWS, end)]):
+                sheet.append(row)
+    workbook.save(target)
+
+
+def write_dataframe(df, target, fmt=None):
+    """
+    Writes df as xlsx, csv or parquet. The format defaults to the extension of `target` (xlsx if unknown).
+    """
+    fmt = fmt or format_for(target)
+    if fmt == "csv":
+        # utf-8-sig so Excel opens Vietnamese text correctly
+        df.to_csv(target, index=False, encoding="utf-8-sig")
+    elif fmt == "parquet":
+        if pyarrow is None:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+        df.to_parquet(target, index=False)
+    else:
+        write_xlsx(df, target)
+
+
+class ExportCache:
+    """
+    Exported files on disk, keyed by (result version, format). A version is anything that
+    changes when the result does (e.g. the job id that produced it), so each file is built
+    at most once per result and format, and only when it is first requested.
+    The oldest files are deleted once more than `max_files` are kept.
+    """
+
+    def __init__(self, directory=None, max_files=DEFAULT_CACHED_EXPORTS):
+        self.directory = directory or tempfile.mkdtemp(prefix="kohler_exports_")
+        self.max_files = max_files
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, version, df, fmt):
+        """
+        Path of the export of `df` (a DataFrame, or a function returning one) for this version, built if needed.
+        """
+        key = (str(version), fmt)
+        with self._lock:
+            if key in self._files and os.path.exists(self._files[key]):
+                self._files.move_to_end(key)
+                return self._files[key]
+            os.makedirs(self.directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(suffix=f".{fmt}", dir=self.directory)
+            os.close(fd)
+            try:
+                write_dataframe(df() if callable(df) else df, path, fmt)
+            except Exception:
+                os.remove(path)
+                raise
+            self._files[key] = path
+            while len(self._files) > self.max_files:
+                _, old_path = self._files.popitem(last=False)
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+            return path
+
+    def data(self, version, df, fmt):
+        with open(self.path(version, df, fmt), "rb") as f:
+            return f.read()
+
+    def download(self, version, df, fmt):
+        """
+        A no-argument callable for st.download_button: the file is only built when the button is clicked.
+        """
+        return lambda: self.data(version, df, fmt)
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            shutil.rmtree(self.directory, ignore_errors=True)
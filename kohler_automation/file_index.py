@@ -0,0 +1,209 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from result_cache import sqlite_connect
+
+DEFAULT_FILE_INDEX_PATH = os.environ.get(
+    "KOHLER_FILE_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_index.sqlite3"),
+)
+
+DIFF_COLUMNS = ["Change", "File Path", "Size (Bytes)", "Modified (UTC)"]
+
+_root_locks = {}
+_root_locks_guard = threading.Lock()
+
+
+class PreviousScan:
+    """
+    Read access to one stored scan for FolderScanner: dir_state() returns a directory's
+    stored subdirectories and files if its mtime hasn't changed since that scan.
+    """
+
+    def __init__(self, path, scan_id):
+        self.path = path
+        self.scan_id = scan_id
+        with sqlite_connect(path) as conn:
+            self._dirs = {
+                dir_path: (mtime, subdirs)
+                for dir_path, mtime, subdirs in conn.execute(
+                    "SELECT path, mtime, subdirs FROM scan_dirs WHERE scan_id = ?", (scan_id,)
+                )
+            }
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        # One read connection per scanner thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def dir_state(self, dir_path, mtime):
+        """
+        Returns (subdir names, [(name, size, mtime)]) from the stored scan, or None if the
+        directory is new or its mtime changed (entries were added, removed or renamed).
+        """
+        known = self._dirs.get(dir_path)
+        if known is None or known[0] != mtime:
+            return None
+        files = self._conn().execute(
+            "SELECT name, size, mtime FROM scan_files WHERE scan_id = ? AND dir = ?", (self.scan_id, dir_path)
+        ).fetchall()
+        return json.loads(known[1]), files
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+
+class FileIndex:
+    """
+    On-disk record of the last complete Folder Scanner scan of each root: every directory
+    (mtime and subdirectory names) and every file (size, mtime). Used to skip re-listing
+    unchanged directories on the next scan and to report what changed between scans.
+    """
+
+    def __init__(self, path=DEFAULT_FILE_INDEX_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS scans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    root TEXT NOT NULL,
+                    finished_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS scan_dirs (
+                    scan_id INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    subdirs TEXT NOT NULL,
+                    PRIMARY KEY (scan_id, path)
+                );
+                CREATE TABLE IF NOT EXISTS scan_files (
+                    scan_id INTEGER NOT NULL,
+                    dir TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    PRIMARY KEY (scan_id, dir, name)
+                );
+                """
+            )
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def previous_scan(self, root):
+        """
+        The last stored scan of `root` as a PreviousScan, or None if it was never scanned.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM scans WHERE root = ? ORDER BY id DESC LIMIT 1", (os.path.abspath(root),)
+            ).fetchone()
+        return PreviousScan(self.path, row[0]) if row else None
+
+    @staticmethod
+    def root_lock(root):
+        """
+        Lock held for the whole scan of `root`, so two scans of one folder don't run at once
+        and the second one can build on the first.
+        """
+        root = os.path.abspath(root)
+        with _root_locks_guard:
+            return _root_locks.setdefault(root, threading.Lock())
+
+    def _insert_scan(self, conn, scanner):
+        scan_id = conn.execute(
+            "INSERT INTO scans (root, finished_at) VALUES (?, ?)", (os.path.abspath(scanner.root), time.time())
+        ).lastrowid
+        conn.executemany(
+            "INSERT OR REPLACE INTO scan_dirs (scan_id, path, mtime, subdirs) VALUES (?, ?, ?, ?)",
+            ((scan_id, path, mtime, json.dumps(subdirs)) for path, mtime, subdirs in scanner.iter_dirs()),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO scan_files (scan_id, dir, name, size, mtime) VALUES (?, ?, ?, ?, ?)",
+            ((scan_id, *row) for row in scanner.iter_files()),
+        )
+        return scan_id
+
+    def save_scan(self, scanner):
+        """
+        Stores a finished FolderScanner's directories and files. Returns the new scan id.
+        """
+        with self._connect() as conn:
+            return self._insert_scan(conn, scanner)
+
+    @staticmethod
+    def _diff_rows(conn, old_id, new_id):
+        return conn.execute(
+            """
+            SELECT 'Added', n.dir, n.name, n.size, n.mtime FROM scan_files n
+            LEFT JOIN scan_files o ON o.scan_id = :old AND o.dir = n.dir AND o.name = n.name
+            WHERE n.scan_id = :new AND o.name IS NULL
+            UNION ALL
+            SELECT 'Removed', o.dir, o.name, o.size, o.mtime FROM scan_files o
+            LEFT JOIN scan_files n ON n.scan_id = :new AND n.dir = o.dir AND n.name = o.name
+            WHERE o.scan_id = :old AND n.name IS NULL
+            UNION ALL
+            SELECT 'Modified', n.dir, n.name, n.size, n.mtime FROM scan_files n
+            JOIN scan_files o ON o.scan_id = :old AND o.dir = n.dir AND o.name = n.name
+            WHERE n.scan_id = :new AND (o.size != n.size OR o.mtime != n.mtime)
+            """,
+            {"old": old_id, "new": new_id},
+        ).fetchall()
+
+    @staticmethod
+    def _diff_frame(rows):
+        df = pd.DataFrame(
+            [(change, os.path.join(dir_path, name), size, mtime) for change, dir_path, name, size, mtime in rows],
+            columns=DIFF_COLUMNS,
+        )
+        df["Modified (UTC)"] = pd.to_datetime(df["Modified (UTC)"], unit="s")
+        return df.sort_values(["Change", "File Path"], ignore_index=True)
+
+    def diff(self, old_id, new_id):
+        """
+        Files added, removed or modified (size or mtime) between two scans, as a DataFrame.
+        """
+        with self._connect() as conn:
+            rows = self._diff_rows(conn, old_id, new_id)
+        return self._diff_frame(rows)
+
+    @staticmethod
+    def _drop_scans(conn, scan_ids):
+        for table, column in (("scan_files", "scan_id"), ("scan_dirs", "scan_id"), ("scans", "id")):
+            conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(scan_id,) for scan_id in scan_ids])
+
+    def drop_scan(self, scan_id):
+        with self._connect() as conn:
+            self._drop_scans(conn, [scan_id])
+
+    def record_scan(self, scanner):
+        """
+        Saves a finished scan as the latest one for its root and drops every older scan of
+        that root, all in one transaction. Returns the diff against the newest older scan
+        (None if there was none).
+        """
+        root = os.path.abspath(scanner.root)
+        with self._connect() as conn:
+            # Take the write lock up front so another scan of this root can't slip in between
+            conn.execute("BEGIN IMMEDIATE")
+            scan_id = self._insert_scan(conn, scanner)
+            older = [row[0] for row in conn.execute(
+                "SELECT id FROM scans WHERE root = ? AND id < ? ORDER BY id DESC", (root, scan_id)
+            )]
+            rows = self._diff_rows(conn, older[0], scan_id) if older else None
+            self._drop_scans(conn, older)
+        return self._diff_frame(rows) if rows is not None else None
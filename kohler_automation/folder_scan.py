@@ -0,0 +1,188 @@
+import concurrent.futures
+import os
+import threading
+import time
+import pandas as pd
+
+# Listing a directory on a network share is mostly waiting on the server, so use many more
+# threads than cores
+DEFAULT_SCAN_WORKERS = int(os.environ.get("KOHLER_SCAN_WORKERS", 16))
+# Rows per columnar chunk
+CHUNK_ROWS = 50_000
+
+SCAN_COLUMNS = ["File Name", "File Path", "Extension", "Size (Bytes)", "Modified (UTC)"]
+
+
+def _empty_chunk():
+    return {"dir_id": [], "name": [], "size": [], "mtime": []}
+
+
+class FolderScanner:
+    """
+    Lists every file under `root` with os.scandir, scanning directories in parallel on a
+    thread pool. Results are kept as columnar chunks (directory id, name, size, mtime) and
+    only turned into a DataFrame by dataframe(). Counters can be read while it runs;
+    run() stops early when `cancel_event` is set.
+
+    With `previous` (a file_index.PreviousScan), a directory whose mtime is unchanged is not
+    listed again: its files and subdirectories come from the previous scan. Its subdirectories
+    are still visited, since a directory's mtime doesn't change when something deeper does.
+    Files modified in place don't change their directory's mtime either, so those are only
+    picked up when their directory is listed again.
+    """
+
+    def __init__(self, root, workers=DEFAULT_SCAN_WORKERS, chunk_rows=CHUNK_ROWS, previous=None):
+        self.root = os.path.abspath(root)
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.previous = previous
+        self.files = 0
+        self.dirs = 0
+        self.reused_dirs = 0
+        self.bytes = 0
+        self.errors = 0
+        self.started_at = None
+        self.finished_at = None
+        self._dir_paths = []
+        self._dir_mtimes = []
+        self._dir_subdirs = []
+        self._chunks = []
+        self._chunk = _empty_chunk()
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def progress_text(self):
+        reused = f", {self.reused_dirs:,} unchanged" if self.previous else ""
+        return (f"{self.files:,} files in {self.dirs:,} folders{reused} "
+                f"({self.bytes / 2 ** 30:.2f} GB, {self.errors} unreadable) in {self.elapsed:.0f}s")
+
+    def _list_dir(self, path):
+        """
+        Returns (subdirectory names, [(name, size, mtime)]) for one directory.
+        """
+        subdirs, files = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    # Like os.walk: don't follow directory symlinks
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        # Free on Windows (scandir already has it); one stat call elsewhere
+                        stat = entry.stat()
+                        files.append((entry.name, stat.st_size, stat.st_mtime))
+                except OSError:
+                    with self._lock:
+                        self.errors += 1
+        return subdirs, files
+
+    def _record(self, path, mtime, subdirs, files, reused):
+        with self._lock:
+            dir_id = len(self._dir_paths)
+            self._dir_paths.append(path)
+            self._dir_mtimes.append(mtime)
+            self._dir_subdirs.append(subdirs)
+            self.dirs += 1
+            self.reused_dirs += reused
+            chunk = self._chunk
+            for name, size, mtime in files:
+                chunk["dir_id"].append(dir_id)
+                chunk["name"].append(name)
+                chunk["size"].append(size)
+                chunk["mtime"].append(mtime)
+                self.bytes += size
+            self.files += len(files)
+            if len(chunk["name"]) >= self.chunk_rows:
+                self._flush()
+
+    def _flush(self):
+        # Called with the lock held
+        if self._chunk["name"]:
+            self._chunks.append(pd.DataFrame({
+                "dir_id": pd.array(self._chunk["dir_id"], dtype="int32"),
+                "name": self._chunk["name"],
+                "size": pd.array(self._chunk["size"], dtype="int64"),
+                "mtime": pd.array(self._chunk["mtime"], dtype="float64"),
+            }))
+            self._chunk = _empty_chunk()
+
+    def _scan_dir(self, path):
+        try:
+            mtime = os.stat(path).st_mtime
+            known = self.previous.dir_state(path, mtime) if self.previous else None
+            subdirs, files = known or self._list_dir(path)
+        except OSError:
+            with self._lock:
+                self.errors += 1
+            return []
+        self._record(path, mtime, subdirs, files, known is not None)
+        return [os.path.join(path, name) for name in subdirs]
+
+    def run(self, cancel_event=None):
+        """
+        Scans the tree. Returns True if it finished, False if it was cancelled.
+        """
+        self.started_at = time.time()
+        completed = True
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scan") as pool:
+            pending = {pool.submit(self._scan_dir, self.root)}
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                if cancel_event is not None and cancel_event.is_set():
+                    for future in pending:
+                        future.cancel()
+                    completed = False
+                    break
+                for future in done:
+                    for subdir in future.result():
+                        pending.add(pool.submit(self._scan_dir, subdir))
+        with self._lock:
+            self._flush()
+        if self.previous:
+            self.previous.close()
+        self.finished_at = time.time()
+        return completed
+
+    def iter_dirs(self):
+        """
+        Yields (path, mtime, subdirectory names) for every directory scanned.
+        """
+        yield from zip(self._dir_paths, self._dir_mtimes, self._dir_subdirs)
+
+    def iter_files(self):
+        """
+        Yields (directory path, name, size, mtime) for every file found.
+        """
+        for chunk in self._chunks:
+            for dir_id, name, size, mtime in zip(chunk["dir_id"], chunk["name"], chunk["size"], chunk["mtime"]):
+                yield self._dir_paths[dir_id], name, int(size), float(mtime)
+
+    def dataframe(self):
+        """
+        All files found so far as a DataFrame with SCAN_COLUMNS, sorted by path.
+        """
+        with self._lock:
+            chunks = list(self._chunks)
+            dir_paths = list(self._dir_paths)
+        if not chunks:
+            return pd.DataFrame(columns=SCAN_COLUMNS)
+
+        data = pd.concat(chunks, ignore_index=True)
+        # Directory prefixes are stored once and joined to the names here
+        prefixes = pd.Series([os.path.join(path, "") for path in dir_paths], dtype=object)
+        names = data["name"]
+        df = pd.DataFrame({
+            "File Name": names,
+            "File Path": prefixes.iloc[data["dir_id"].to_numpy()].to_numpy() + names.to_numpy(),
+            "Extension": names.str.extract(r"(\.[^.]+)$", expand=False).str.lower().fillna(""),
+            "Size (Bytes)": data["size"],
+            "Modified (UTC)": pd.to_datetime(data["mtime"], unit="s"),
+        })
+        return df.sort_values("File Path", ignore_index=True)
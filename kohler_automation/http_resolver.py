@@ -0,0 +1,69 @@
+import threading
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from kohler_codes import USER_AGENT
+
+# Max parallel HTTP lookups; also the size of the shared connection pool
+DEFAULT_HTTP_CONCURRENCY = 8
+HTTP_TIMEOUT = 15
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process-wide requests Session so all lookups share one keep-alive
+    connection pool.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=DEFAULT_HTTP_CONCURRENCY,
+                max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504]),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept-Language": "en-US,en;q=0.9",
+            })
+            _session = session
+        return _session
+
+
+def resolve_static(url, code):
+    """
+    Fetches a known product page without a browser and reads the product name (H1)
+    and whether `code` is shown on it.
+    Returns a result row, or None if the static HTML isn't enough (the page needs
+    JavaScript to render) and the browser should be used instead.
+    """
+    try:
+        response = get_session().get(url, timeout=HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"HTTP lookup failed for {code}: {e}")
+        return None
+    if response.status_code != 200 or "html" not in response.headers.get("Content-Type", ""):
+        return None
+
+    soup = BeautifulSoup(response.text, "html.parser")
+    h1 = soup.find("h1")
+    product_name = h1.get_text(" ", strip=True) if h1 else ""
+    if not product_name:
+        return None
+
+    # Only count visible text, like the browser path does with body.inner_text()
+    for tag in soup(["script", "style", "noscript", "template"]):
+        tag.decompose()
+    body = soup.body or soup
+    if code not in body.get_text(" "):
+        return None
+
+    print(f"HTTP lookup: {code} -> {product_name}")
+    return {'Code': code, 'Product Name': product_name, 'Link': response.url, 'Match Verified': True}
@@ -0,0 +1,124 @@
+import itertools
+import queue
+import threading
+import time
+import traceback
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class Job:
+    """
+    A unit of background work with progress, partial results and cancellation.
+    The worker calls `add_row`/`set_total`; the UI reads `progress`, `rows()` and `status`.
+    """
+
+    def __init__(self, job_id, name, total=0):
+        self.id = job_id
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 0.0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def set_total(self, total):
+        self.total = total
+
+    def add_row(self, index, row):
+        with self._lock:
+            if index not in self._rows:
+                self.done += 1
+            self._rows[index] = row
+
+    def rows(self):
+        """
+        Partial results so far, in input order.
+        """
+        with self._lock:
+            return [self._rows[i] for i in sorted(self._rows)]
+
+
+class JobManager:
+    """
+    FIFO job queue served by a fixed number of worker threads, so concurrent users
+    wait their turn instead of all scraping at once.
+    """
+
+    def __init__(self, workers=1, keep_finished=50):
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        for n in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True).start()
+
+    def submit(self, name, target, total=0):
+        """
+        Queues `target(job)` to run on a worker thread and returns the Job.
+        """
+        with self._lock:
+            job = Job(next(self._ids), name, total)
+            self._jobs[job.id] = job
+            self._prune()
+        self._queue.put((job, target))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """
+        Number of queued or running jobs ahead of `job` (0 if it is running or finished).
+        """
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.active and j.id < job.id)
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if not j.active]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:-self.keep_finished or None]:
+            del self._jobs[job.id]
+
+    def _work(self):
+        while True:
+            job, target = self._queue.get()
+            # finished_at is set before the final status: _prune sorts finished jobs by it
+            if job.cancel_event.is_set():
+                job.finished_at = time.time()
+                job.status = CANCELLED
+                continue
+            job.started_at = time.time()
+            job.status = RUNNING
+            try:
+                target(job)
+                status = CANCELLED if job.cancel_event.is_set() else DONE
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                status = FAILED
+            job.finished_at = time.time()
+            job.status = status
@@ -0,0 +1,76 @@
+import json
+import os
+
+
+def row_key(index, value):
+    """
+    Journal key for an input row: its position plus its identifying value, so a
+    resumed run only skips rows when the input file hasn't been reshuffled.
+    """
+    return f"{index}:{str(value).strip()}"
+
+
+def _json_default(value):
+    # numpy/pandas scalars (e.g. int64 read from Excel) -> plain Python values
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class Journal:
+    """
+    Append-only JSONL record of finished rows. Every row is flushed to disk as soon
+    as it is written, so a crashed run can be resumed from where it stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tail_checked = False
+
+    def _ends_with_newline(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return True
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def load(self):
+        """
+        Returns {key: row} for every complete line in the journal.
+        """
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line may be cut short if the process died mid-write
+                    continue
+                done[entry["key"]] = entry["row"]
+        return done
+
+    def append(self, key, row):
+        line = json.dumps({"key": key, "row": row}, ensure_ascii=False, default=_json_default)
+        if not self._tail_checked:
+            # Start on a fresh line after a row cut short by a crash, so it isn't glued to ours
+            if not self._ends_with_newline():
+                line = "\n" + line
+            self._tail_checked = True
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._tail_checked = False
+
+    def rows_for(self, keys):
+        """
+        Returns the journaled rows for `keys` in that order, skipping keys not recorded.
+        """
+        done = self.load()
+        return [done[key] for key in keys if key in done]
@@ -0,0 +1,28 @@
+# Sent by both the browser contexts and the HTTP resolver
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+def normalize_code(code):
+    return str(code).strip().upper()
+
+
+def split_code(code):
+    """
+    Splits a product code into (base_code, color_code).
+    Assumption: Color is always after the last hyphen
+    """
+    if '-' in code:
+        base_code, color_code = code.rsplit('-', 1)
+        return base_code, color_code
+    return code, None
+
+
+def split_variant(code):
+    """
+    Like split_code, but a base with no digits (e.g. "K-2345" -> "K") is not a product
+    plus finish, so the whole code is returned as its own base with no color.
+    """
+    base_code, color_code = split_code(code)
+    if not any(ch.isdigit() for ch in base_code):
+        return code, None
+    return base_code, color_code
@@ -0,0 +1,101 @@
+import json
+import os
+import time
+import zlib
+from result_cache import sqlite_connect
+
+# Separate file from the scrape cache: OCR blobs are large and evicted by size, not age
+DEFAULT_OCR_CACHE_PATH = os.environ.get(
+    "KOHLER_OCR_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_cache.sqlite3"),
+)
+# Least recently used pages are dropped once the stored blobs exceed this
+DEFAULT_OCR_CACHE_MB = float(os.environ.get("KOHLER_OCR_CACHE_MB", 500))
+
+
+def page_key(fingerprint, dpi, engine_version):
+    return f"{fingerprint}:{dpi}:{engine_version}"
+
+
+class OcrCache:
+    """
+    On-disk cache of per-page OCR results, keyed by page_key() (page content hash,
+    DPI and Tesseract version). Shared by every session and kept across restarts.
+    """
+
+    def __init__(self, path=DEFAULT_OCR_CACHE_PATH, max_mb=DEFAULT_OCR_CACHE_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_pages (
+                    key TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ocr_pages_last_used ON ocr_pages (last_used)")
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def get_many(self, keys):
+        """
+        Returns {key: page result} for the keys that are cached, and marks them as recently used.
+        """
+        keys = list(set(keys))
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT key, data FROM ocr_pages WHERE key IN ({placeholders})", chunk)
+                for key, data in rows:
+                    found[key] = json.loads(zlib.decompress(data))
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE ocr_pages SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+        return found
+
+    def put_many(self, results):
+        """
+        Stores {key: page result} and evicts the least recently used pages if the cache is over size.
+        """
+        now = time.time()
+        values = []
+        for key, result in results.items():
+            data = zlib.compress(json.dumps(result).encode("utf-8"))
+            values.append((key, data, len(data), now))
+        if not values:
+            return 0
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ocr_pages (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+                values,
+            )
+            self._evict(conn)
+        return len(values)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM ocr_pages ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM ocr_pages WHERE key = ?", doomed)
+        print(f"OCR cache: evicted {len(doomed)} pages")
+
+    def size_bytes(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_pages").fetchone()[0]
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ocr_pages")
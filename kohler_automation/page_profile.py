@@ -0,0 +1,143 @@
+import re
+from collections import Counter
+from urllib.parse import urlsplit
+
+# Resource types we never read (we only need HTML, scripts, CSS and XHR)
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+
+# Analytics / ads / session-replay hosts. Matched against the end of the request host.
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "bing.com",
+    "adobedtm.com",
+    "omtrdc.net",
+    "demdex.net",
+    "everesttech.net",
+    "criteo.com",
+    "criteo.net",
+    "pinterest.com",
+    "pinimg.com",
+    "tiktok.com",
+    "ads-twitter.com",
+    "linkedin.com",
+    "licdn.com",
+    "quantummetric.com",
+    "nr-data.net",
+    "newrelic.com",
+    "optimizely.com",
+    "segment.io",
+    "segment.com",
+    "qualtrics.com",
+    "cookielaw.org",
+    "onetrust.com",
+    "yimg.com",
+    "yahoo.com",
+)
+
+# Rough average transfer sizes, used to estimate what blocked requests would have cost
+ESTIMATED_BYTES = {
+    "image": 60_000,
+    "media": 500_000,
+    "font": 40_000,
+    "script": 50_000,
+    "stylesheet": 20_000,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+
+def _host_matches(host, domains):
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+def _format_bytes(num):
+    return f"{num / 1_048_576:.1f} MB"
+
+
+class PageProfile:
+    """
+    Request-interception profile for Playwright browser contexts.
+    Aborts non-essential resource types and tracker hosts, lets through anything
+    matching `allow_patterns`, and keeps counts of what was allowed/blocked.
+    """
+
+    def __init__(self, name, block_types=BLOCKED_RESOURCE_TYPES, block_domains=TRACKER_DOMAINS, allow_patterns=()):
+        self.name = name
+        self.block_types = set(block_types)
+        self.block_domains = tuple(block_domains)
+        self.allow_patterns = [re.compile(p) for p in allow_patterns]
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+        self.blocked = Counter()
+        self.blocked_bytes_estimate = 0
+
+    def should_block(self, url, resource_type):
+        """
+        Returns the reason ("tracker" or the resource type) if the request should be aborted, else None.
+        """
+        if any(p.search(url) for p in self.allow_patterns):
+            return None
+        host = urlsplit(url).hostname or ""
+        if _host_matches(host, self.block_domains):
+            return "tracker"
+        if resource_type in self.block_types:
+            return resource_type
+        return None
+
+    async def attach(self, context):
+        """
+        Installs the profile on a browser context (applies to all its pages).
+        """
+        await context.route("**/*", self._handle_route)
+        context.on("requestfinished", self._on_request_finished)
+
+    async def _handle_route(self, route):
+        request = route.request
+        reason = self.should_block(request.url, request.resource_type)
+        if reason:
+            self.blocked[reason] += 1
+            self.blocked_bytes_estimate += ESTIMATED_BYTES.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+            await route.abort()
+        else:
+            self.allowed_requests += 1
+            await route.continue_()
+
+    async def _on_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+            self.allowed_bytes += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        except Exception:
+            # Page/context may already be closed
+            pass
+
+    def report(self):
+        blocked_total = sum(self.blocked.values())
+        details = ", ".join(f"{reason} {count}" for reason, count in self.blocked.most_common())
+        return (
+            f"[{self.name}] {self.allowed_requests} requests loaded ({_format_bytes(self.allowed_bytes)}), "
+            f"{blocked_total} blocked (~{_format_bytes(self.blocked_bytes_estimate)} saved)"
+            + (f": {details}" if details else "")
+        )
+
+
+def kohler_profile():
+    # Kohler pages: we only read the H1, page text and swatch inputs
+    return PageProfile("Kohler")
+
+
+def customs_profile():
+    # Customs portal: keep the captcha image (served by the portal itself), drop everything else heavy
+    return PageProfile(
+        "Customs",
+        allow_patterns=(
+            r"(?i)captcha",
+            r"(?i)checkcode",
+            r"(?i)^https?://customs\.gov\.vn(:\d+)?/[^?#]*\.(jsp|do|action)\b",
+        ),
+    )
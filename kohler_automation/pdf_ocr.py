@@ -0,0 +1,469 @@
+import concurrent.futures
+import hashlib
+import itertools
+import math
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+from ocr_cache import page_key
+try:
+    # Optional: also counts the tesseract processes the workers start
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_DPI = 200
+
+# Adaptive DPI: OCR at the low DPI first and re-render at the high one only if Tesseract's
+# mean word confidence is below MIN_MEAN_CONFIDENCE (small or faint print)
+ADAPTIVE_START_DPI = 150
+ADAPTIVE_MAX_DPI = 300
+MIN_MEAN_CONFIDENCE = 70
+
+# Page classification: images smaller than MIN_IMAGE_AREA (share of the page) are logos/icons;
+# an image counts as having a text layer once text blocks cover MIN_TEXT_COVERAGE of it
+MIN_IMAGE_AREA = 0.05
+MIN_TEXT_COVERAGE = 0.1
+
+# Streaming mode: pages in flight per worker, and the memory budget (MB) for one run: its OCR
+# workers (with their Tesseract processes) plus what this process grows by during the run.
+# Other children of the server (the shared browser, other sessions' pools) don't count.
+# A worker costs roughly WORKER_OVERHEAD_MB before its first page.
+STREAM_PAGES_PER_WORKER = 2
+DEFAULT_MEMORY_LIMIT_MB = float(os.environ.get("KOHLER_PDF_MEMORY_MB", 1536))
+WORKER_OVERHEAD_MB = 150
+
+# Document handle opened once per worker process by _init_worker
+_worker_doc = None
+_tesseract_version = None
+
+
+def available_cpus():
+    """
+    Cores this process may actually run on (respects CPU affinity / container cpusets).
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def tesseract_version():
+    """
+    Installed Tesseract version (part of the OCR cache key), or None if Tesseract is missing.
+    """
+    global _tesseract_version
+    if _tesseract_version is None:
+        try:
+            _tesseract_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            return None
+    return _tesseract_version
+
+
+def page_fingerprint(doc, page_num):
+    """
+    Hash of what a page draws: its content stream, geometry, and the images, fonts and
+    form XObjects it uses. Identical pages hash the same even in different PDFs.
+    """
+    page = doc[page_num]
+    digest = hashlib.sha256()
+    digest.update(f"{tuple(page.rect)}:{page.rotation}".encode())
+    digest.update(page.read_contents())
+    xrefs = {image[0] for image in page.get_images(full=True)}
+    xrefs |= {font[0] for font in page.get_fonts(full=True)}
+    xrefs |= {xobject[0] for xobject in page.get_xobjects()}
+    for xref in sorted(xrefs):
+        if xref > 0:
+            digest.update(doc.xref_stream_raw(xref) or doc.xref_object(xref).encode())
+    return digest.hexdigest()
+
+
+def classify_page(page):
+    """
+    Classifies a page from its text layer and image placements:
+    - "text":    text layer only, images with text over them, or an invisible OCR layer
+                 (e.g. written by embed_text_layer); search_for finds it
+    - "scanned": large images and no text layer
+    - "mixed":   text layer plus large images that have no text over them
+    - "blank":   neither text nor images
+    """
+    page_area = abs(page.rect) or 1
+    text_rects = [fitz.Rect(block[:4]) for block in page.get_text("blocks") if block[6] == 0 and block[4].strip()]
+
+    has_images = needs_ocr = False
+    for info in page.get_image_info():
+        image_rect = fitz.Rect(info["bbox"]) & page.rect
+        if image_rect.is_empty:
+            continue
+        has_images = True
+        image_area = abs(image_rect)
+        covered = sum(abs(image_rect & text_rect) for text_rect in text_rects)
+        if image_area / page_area >= MIN_IMAGE_AREA and covered / image_area < MIN_TEXT_COVERAGE:
+            needs_ocr = True
+            break
+
+    # Invisible text (render mode 3) means the page was OCR'd before, however sparse its text is
+    if needs_ocr and text_rects and any(span["type"] == 3 for span in page.get_texttrace()):
+        needs_ocr = False
+    if needs_ocr:
+        return "mixed" if text_rects else "scanned"
+    if text_rects or has_images:
+        return "text"
+    return "blank"
+
+
+def page_needs_ocr(page):
+    return classify_page(page) in ("scanned", "mixed")
+
+
+def mean_confidence(ocr_data):
+    """
+    Average Tesseract confidence of the recognized words (0 when nothing was read).
+    """
+    confs = [float(conf) for conf, text in zip(ocr_data["conf"], ocr_data["text"])
+             if str(text).strip() and float(conf) >= 0]
+    return sum(confs) / len(confs) if confs else 0.0
+
+
+def _ocr_at(page, page_num, dpi):
+    # Render straight to grayscale (1 byte per pixel instead of an RGB copy converted afterwards)
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    width, height = pix.width, pix.height
+    img = Image.frombytes("L", [width, height], pix.samples)
+    pix = None
+
+    # Get OCR data
+    ocr_data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+
+    return {
+        "page_num": page_num,
+        "ocr_data": ocr_data,
+        "width": width,
+        "height": height,
+        "rect_width": page.rect.width,
+        "rect_height": page.rect.height,
+        "dpi": dpi,
+        "confidence": mean_confidence(ocr_data),
+    }
+
+
+def ocr_page(doc, page_num, dpi=DEFAULT_DPI, max_dpi=None):
+    """
+    Renders one page and runs Tesseract on it. Returns the OCR word boxes plus the
+    pixel/page sizes needed to map them back to PDF coordinates.
+    With max_dpi, a page read with poor confidence is rendered again at max_dpi and
+    the better of the two reads is kept.
+    """
+    try:
+        page = doc[page_num]
+        result = _ocr_at(page, page_num, dpi)
+        if max_dpi and max_dpi > dpi and result["confidence"] < MIN_MEAN_CONFIDENCE:
+            retry = _ocr_at(page, page_num, max_dpi)
+            if retry["confidence"] >= result["confidence"]:
+                result = retry
+        return result
+    except Exception as e:
+        return {"page_num": page_num, "error": str(e)}
+
+
+def line_baseline(line_words):
+    """
+    Estimates a line's baseline from its OCR boxes, which are ink bounds: most words end on
+    the baseline, a few dip below it (descenders) and marks like - " ' sit above it, so the
+    median bottom of the words with a letter or digit is used.
+    """
+    bottoms = [rect[3] for rect, text in line_words if any(ch.isalnum() for ch in text)]
+    return statistics.median(bottoms or [rect[3] for rect, _ in line_words])
+
+
+def embed_text_layer(doc, words):
+    """
+    Writes OCR words into the document as invisible text (render mode 3) so the pages become
+    searchable/selectable in any viewer and page.search_for finds them without OCR.
+    `words` is an iterable of (page_num, line_id, rect, text) in PDF points, e.g. WordIndex.words(OCR).
+    Each word starts at its OCR box's left edge on the line's baseline, sized so it spans
+    the box's width; search hits on the saved file then land on the scanned word.
+    Returns the number of words written.
+    """
+    font = fitz.Font("helv")
+    writers = {}
+    count = 0
+    for (page_num, _), line_words in itertools.groupby(words, key=lambda w: (w[0], w[1])):
+        line_words = [(rect, text) for _, _, rect, text in line_words if text and rect[2] > rect[0]]
+        if not line_words:
+            continue
+        baseline = line_baseline(line_words)
+        writer = writers.get(page_num)
+        if writer is None:
+            writer = writers[page_num] = fitz.TextWriter(doc[page_num].rect)
+        for rect, text in line_words:
+            unit_width = font.text_length(text, fontsize=1)
+            if unit_width <= 0:
+                continue
+            writer.append((rect[0], baseline), text, font=font, fontsize=(rect[2] - rect[0]) / unit_width)
+            count += 1
+    for page_num, writer in writers.items():
+        writer.write_text(doc[page_num], render_mode=3)
+    return count
+
+
+def _init_worker(pdf_path, tesseract_cmd):
+    global _worker_doc
+    # Parallelism comes from the worker processes; keep each Tesseract run on one thread
+    # so N workers don't fight over N x cores threads.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    _worker_doc = fitz.open(pdf_path)
+
+
+def _ocr_chunk(page_nums, dpi, max_dpi):
+    return [ocr_page(_worker_doc, page_num, dpi, max_dpi) for page_num in page_nums]
+
+
+def page_chunks(page_nums, workers, chunk_size=None):
+    """
+    Splits the pages into runs of consecutive pages; by default ~4 chunks per worker so
+    slow pages don't leave other workers idle at the end.
+    """
+    chunk_size = chunk_size or max(1, math.ceil(len(page_nums) / (workers * 4)))
+    return [page_nums[start:start + chunk_size] for start in range(0, len(page_nums), chunk_size)]
+
+
+def _process_pool(pdf_path, workers):
+    # "spawn" so workers don't inherit the Streamlit server's threads (browser loop, job workers)
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(pdf_path, pytesseract.pytesseract.tesseract_cmd),
+    )
+
+
+def _ocr_pages(pdf_path, page_nums, dpi, max_dpi, workers, chunk_size):
+    workers = max(1, min(workers or available_cpus(), len(page_nums)))
+    if workers == 1:
+        with fitz.open(pdf_path) as doc:
+            return [ocr_page(doc, page_num, dpi, max_dpi) for page_num in page_nums]
+
+    results = []
+    with _process_pool(pdf_path, workers) as executor:
+        futures = [executor.submit(_ocr_chunk, chunk, dpi, max_dpi) for chunk in page_chunks(page_nums, workers, chunk_size)]
+        for future in concurrent.futures.as_completed(futures):
+            results.extend(future.result())
+    return results
+
+
+def _plan_pages(doc, selective, cache, dpi, max_dpi):
+    """
+    Returns (pages to OCR, {page_num: cache key}); pages that can't be fingerprinted get no key.
+    """
+    if selective:
+        pages = [page_num for page_num in range(len(doc)) if page_needs_ocr(doc[page_num])]
+        print(f"OCR needed on {len(pages)}/{len(doc)} pages")
+    else:
+        pages = list(range(len(doc)))
+    keys = {}
+    version = tesseract_version() if cache else None
+    if version:
+        dpi_key = f"{dpi}-{max_dpi}" if max_dpi else dpi
+        for page_num in pages:
+            try:
+                keys[page_num] = page_key(page_fingerprint(doc, page_num), dpi_key, version)
+            except Exception as e:
+                print(f"Could not fingerprint page {page_num + 1}, it won't be cached: {e}")
+    return pages, keys
+
+
+def _cache_entry(res):
+    return {k: v for k, v in res.items() if k != "page_num"}
+
+
+def ocr_document(pdf_bytes, dpi=DEFAULT_DPI, workers=None, chunk_size=None, cache=None,
+                 max_dpi=None, selective=False):
+    """
+    OCRs the pages of a PDF on a process pool and returns the per-page results sorted by page.
+    Each worker opens the document once (from a temp file) and renders page-range chunks.
+    - cache: an OcrCache; pages already OCR'd (in any document) are read from it
+    - max_dpi: re-render pages read with poor confidence at this DPI (see ocr_page)
+    - selective: only OCR pages whose images aren't covered by a text layer (see classify_page);
+      other pages get no result since search_for already finds their text
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(pdf_bytes)
+        pdf_path = tmp.name
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            pages, keys = _plan_pages(doc, selective, cache, dpi, max_dpi)
+
+        results = []
+        if keys:
+            cached = cache.get_many(keys.values())
+            for page_num, key in keys.items():
+                if key in cached:
+                    results.append({**cached[key], "page_num": page_num})
+            print(f"OCR cache: {len(results)}/{len(pages)} pages cached")
+
+        done = {res["page_num"] for res in results}
+        missing = [page_num for page_num in pages if page_num not in done]
+        if missing:
+            fresh = _ocr_pages(pdf_path, missing, dpi, max_dpi, workers, chunk_size)
+            results.extend(fresh)
+            if keys:
+                cache.put_many({
+                    keys[res["page_num"]]: _cache_entry(res)
+                    for res in fresh
+                    if "error" not in res and res["page_num"] in keys
+                })
+
+        results.sort(key=lambda x: x["page_num"])
+        return results
+    finally:
+        os.remove(pdf_path)
+
+
+def spill_to_temp(fileobj, suffix=".pdf"):
+    """
+    Copies an uploaded file to a temp file in 1 MB pieces and returns its path (caller removes it).
+    """
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp, length=1024 * 1024)
+        return tmp.name
+
+
+def _proc_descendants(pids):
+    # The pids plus all their descendants, from the parent pid in each /proc/<pid>/stat
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the ")" that closes the command name: state, ppid, ...
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], list(pids)
+    while stack:
+        pid = stack.pop()
+        found.append(pid)
+        stack.extend(children.get(pid, []))
+    return found
+
+
+def process_memory_mb(pids, descendants=True):
+    """
+    Resident memory of the given processes, plus all their descendants unless
+    descendants=False, in MB. Returns None where it can't be measured (no psutil and no /proc).
+    """
+    pids = list(pids)
+    if psutil is not None:
+        total = 0
+        for pid in pids:
+            try:
+                process = psutil.Process(pid)
+                processes = [process, *process.children(recursive=True)] if descendants else [process]
+            except psutil.Error:
+                continue
+            for proc in processes:
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+        return total / 2 ** 20
+
+    if not os.path.exists("/proc/self/statm"):
+        return None
+    total = 0
+    for pid in (_proc_descendants(pids) if descendants else pids):
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            pass
+    return total / 2 ** 20
+
+
+def memory_in_use_mb():
+    """
+    Resident memory of this process and all its descendants, in MB (None if unmeasurable).
+    """
+    return process_memory_mb([os.getpid()])
+
+
+def _stream_workers(doc, max_dpi, workers, memory_limit_mb):
+    # As many workers as fit in this run's memory budget
+    workers = workers or available_cpus()
+    if not memory_limit_mb or not len(doc):
+        return workers
+    rect = doc[0].rect
+    # Grayscale page at the highest DPI, plus PIL's copy and Tesseract's working images
+    page_mb = rect.width * rect.height * (max_dpi / 72) ** 2 * 4 / 2 ** 20
+    return max(1, min(workers, int(memory_limit_mb // (WORKER_OVERHEAD_MB + page_mb))))
+
+
+def iter_ocr_document(pdf_path, dpi=DEFAULT_DPI, max_dpi=None, selective=False, cache=None, workers=None,
+                      memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB):
+    """
+    Streaming version of ocr_document for very large PDFs: reads the PDF from `pdf_path`,
+    keeps at most STREAM_PAGES_PER_WORKER pages per worker in flight and yields each page
+    result as soon as it is ready (in completion order, not page order), so the caller can
+    use it and drop it. New pages are only started while this run (its workers, their Tesseract
+    processes, and this process's growth since the run started) stays under memory_limit_mb;
+    MemoryError is raised if the budget is exceeded with nothing running.
+    """
+    baseline_mb = process_memory_mb([os.getpid()], descendants=False)
+    with fitz.open(pdf_path) as doc:
+        pages, keys = _plan_pages(doc, selective, cache, dpi, max_dpi)
+        peak_dpi = max(dpi, max_dpi or dpi)
+        workers = max(1, min(_stream_workers(doc, peak_dpi, workers, memory_limit_mb), len(pages) or 1))
+
+    # Cached pages are looked up one by one so they are never all in memory together
+    missing = []
+    for page_num in pages:
+        key = keys.get(page_num)
+        cached = cache.get_many([key]).get(key) if key else None
+        if cached:
+            yield {**cached, "page_num": page_num}
+        else:
+            missing.append(page_num)
+    if not missing:
+        return
+
+    def run_memory_mb():
+        own_mb = process_memory_mb([os.getpid()], descendants=False)
+        # The pool's worker processes (ProcessPoolExecutor keeps them by pid)
+        workers_mb = process_memory_mb(getattr(executor, "_processes", None) or {})
+        if own_mb is None or workers_mb is None:
+            return None
+        return max(0.0, own_mb - baseline_mb) + workers_mb
+
+    def over_budget():
+        used = run_memory_mb() if memory_limit_mb else None
+        return used is not None and used > memory_limit_mb
+
+    window = workers * STREAM_PAGES_PER_WORKER
+    print(f"Streaming OCR of {len(missing)} pages on {workers} workers")
+    with _process_pool(pdf_path, workers) as executor:
+        missing.reverse()
+        in_flight = set()
+        while missing or in_flight:
+            while missing and len(in_flight) < window and not over_budget():
+                in_flight.add(executor.submit(_ocr_chunk, [missing.pop()], dpi, max_dpi))
+            if not in_flight:
+                raise MemoryError(f"PDF processing is using more than the {memory_limit_mb:.0f} MB memory limit")
+            finished, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                for res in future.result():
+                    key = keys.get(res["page_num"])
+                    if key and "error" not in res:
+                        cache.put_many({key: _cache_entry(res)})
+                    yield res
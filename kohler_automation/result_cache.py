@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from kohler_codes import normalize_code
+
+# Cache file lives next to the scripts so it survives Streamlit reruns and restarts
+DEFAULT_CACHE_PATH = os.environ.get(
+    "KOHLER_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "kohler_cache.sqlite3"),
+)
+# Cached results older than this are scraped again
+DEFAULT_TTL_HOURS = float(os.environ.get("KOHLER_CACHE_TTL_HOURS", 24 * 7))
+
+# Results that should never be served from cache
+_FAILED_NAMES = {"", "Error", "Search Failed", "Name not found"}
+
+
+@contextmanager
+def sqlite_connect(path):
+    """
+    Opens a SQLite connection that commits on success and is always closed.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def is_cacheable(row):
+    # Unverified rows may be the wrong product: retry them instead of serving them for a week
+    return (bool(row['Match Verified']) and row['Product Name'] not in _FAILED_NAMES
+            and str(row['Link']).startswith("http"))
+
+
+class ResultCache:
+    """
+    On-disk cache of scrape results keyed by normalized product code.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_hours=DEFAULT_TTL_HOURS):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    code TEXT PRIMARY KEY,
+                    product_name TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    match_verified INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def get_many(self, codes):
+        """
+        Returns {normalized_code: row} for every code with a fresh cache entry.
+        """
+        keys = list({normalize_code(c) for c in codes})
+        if not keys:
+            return {}
+        cutoff = time.time() - self.ttl_seconds
+        found = {}
+        with self._connect() as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT code, product_name, link, match_verified FROM results "
+                    f"WHERE updated_at >= ? AND match_verified = 1 AND code IN ({placeholders})",
+                    [cutoff, *chunk],
+                )
+                for code, name, link, verified in rows:
+                    found[code] = {'Product Name': name, 'Link': link, 'Match Verified': bool(verified)}
+        return found
+
+    def put_many(self, rows):
+        """
+        Stores verified result rows. Failed or unverified lookups are skipped so they get retried next run.
+        """
+        now = time.time()
+        values = [
+            (normalize_code(row['Code']), row['Product Name'], row['Link'], int(bool(row['Match Verified'])), now)
+            for row in rows
+            if is_cacheable(row)
+        ]
+        if not values:
+            return 0
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (code, product_name, link, match_verified, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                values,
+            )
+        return len(values)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
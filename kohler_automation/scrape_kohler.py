@@ -1,142 +1,525 @@
-import pandas as pd
-from playwright.sync_api import sync_playwright
+import argparse
+import asyncio
+import queue
+import re
+import threading
 import time
-import urllib.parse
+from contextlib import asynccontextmanager
+import pandas as pd
+from playwright.async_api import async_playwright
+from kohler_codes import USER_AGENT, normalize_code, split_variant
+from result_cache import ResultCache, DEFAULT_TTL_HOURS
+from url_index import UrlIndex, is_product_url
+from http_resolver import resolve_static, DEFAULT_HTTP_CONCURRENCY
+from page_profile import kohler_profile
+from journal import Journal, row_key
+from export import write_dataframe
+
+KOHLER_HOME = "https://www.kohler.com/en"
+RESULT_COLUMNS = ['Code', 'Product Name', 'Link', 'Match Verified']
+
+# Number of browser contexts/pages working at the same time
+DEFAULT_CONCURRENCY = 4
+# Page navigations per second across all pages (replaces the old fixed 2s sleep)
+DEFAULT_RATE = 1.0
 
-def process_codes(codes_list):
+
+class TokenBucket:
     """
-    Takes a list of product codes, scrapes Kohler.com, and returns a DataFrame with results.
+    Async token bucket: allows `rate` acquisitions per second on average,
+    with bursts of up to `capacity`.
     """
-    # Create DataFrame from list
-    df = pd.DataFrame({'Code': codes_list})
-    
-    # Add columns
-    df['Product Name'] = ''
-    df['Link'] = ''
-    df['Match Verified'] = False
 
-    with sync_playwright() as p:
-        # Launch browser (headless=True for reliable execution in this environment)
-        browser = p.chromium.launch(headless=True)
-        # Use a real user agent to avoid immediate blocking
-        context = browser.new_context(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        page = context.new_page()
-
-        for index, row in df.iterrows():
-            code = str(row['Code']).strip()
-            if not code:
-                continue
-            
-            print(f"Processing: {code}")
-            
-            # Parse code to get base and color
-            # Assumption: Color is always after the last hyphen
-            if '-' in code:
-                base_code = code.rsplit('-', 1)[0]
-                color_code = code.rsplit('-', 1)[1]
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def empty_result(code):
+    return {'Code': code, 'Product Name': '', 'Link': '', 'Match Verified': False}
+
+
+def group_codes(codes):
+    """
+    Groups codes by base code so all finishes of one product share a page load.
+    Returns a list of (base_code, [(index, code, color_code), ...]) in first-seen order.
+    Empty codes are left out. A code whose base has no digits (e.g. "K-2345" -> "K") is
+    not a product plus finish, so it gets a group of its own.
+    """
+    groups = {}
+    for index, code in enumerate(codes):
+        code = str(code).strip()
+        if not code:
+            continue
+        base_code, color_code = split_variant(code)
+        key = base_code.upper()
+        if key not in groups:
+            groups[key] = (base_code, [])
+        groups[key][1].append((index, code, color_code))
+    return list(groups.values())
+
+
+async def search_product(page, code, limiter):
+    """
+    Uses the Kohler.com search panel to navigate to the product page for `code`.
+    Returns True if a product page was reached.
+    """
+    # Direct Search on Kohler.com
+    await limiter.acquire()
+    await page.goto(KOHLER_HOME)
+    await page.wait_for_load_state('domcontentloaded')
+
+    try:
+        # Click search icon
+        await page.click("button[aria-label='Search']")
+        # Type code into search input
+        await page.fill("input#search-side-panel__search-control", code)
+        # Press Enter
+        await page.keyboard.press("Enter")
+
+        # Wait for navigation (URL change) or results
+        await page.wait_for_url("**/products/**", timeout=15000)
+        print(f"Navigated to product page: {page.url}")
+        return True
+    except Exception as e:
+        print(f"Search failed or timed out for {code}: {e}")
+        return False
+
+
+def url_has_color(url, color_code):
+    # Match "-AF" as a whole token so a previously selected finish (e.g. "...-AF") doesn't satisfy "-A"
+    return re.search(rf"-{re.escape(color_code)}(?![A-Za-z0-9])", url, re.IGNORECASE) is not None
+
+
+async def select_color(page, color_code):
+    """
+    Selects a finish on the current product page by clicking the swatch whose input
+    id/value ends with the color code.
+    """
+    if not color_code or url_has_color(page.url, color_code):
+        return
+    print(f"URL does not contain color code {color_code}. Attempting to select color...")
+    try:
+        color_code_upper = color_code.upper()
+        # Selector for the input element
+        color_input_selector = f'input[id$="-{color_code_upper}"], input[value$="-{color_code_upper}"]'
+
+        # Check if such an input exists
+        if await page.locator(color_input_selector).count() > 0:
+            color_input = page.locator(color_input_selector).first
+            color_swatch = color_input.locator('xpath=./ancestor::div[@role="radio"]')
+
+            if await color_swatch.count() > 0:
+                print(f"Found swatch for {color_code_upper}. Clicking...")
+                await color_swatch.first.click()
+                try:
+                    await page.wait_for_url(f"**/*{color_code_upper}*", timeout=5000)
+                    print("URL updated.")
+                except Exception:
+                    print("URL did not update or timed out.")
+            else:
+                print(f"Found input for {color_code_upper} but could not find clickable parent swatch.")
+        else:
+            print(f"Color option {color_code_upper} not found on page.")
+    except Exception as e:
+        print(f"Error selecting color: {e}")
+
+
+async def read_product(page, code):
+    """
+    Reads the product name from the current page and checks that `code` is shown on it.
+    """
+    result = empty_result(code)
+
+    # Extract Product Name (H1)
+    try:
+        product_name = await page.locator('h1').first.inner_text(timeout=5000)
+    except Exception:
+        product_name = "Name not found"
+
+    # Verify if the displayed product code matches the requested code
+    is_match = False
+    try:
+        page_text = await page.locator('body').inner_text()
+        if code in page_text:
+            is_match = True
+            print(f"Verification Successful: Found {code} on page.")
+        else:
+            print(f"Verification Warning: Could not find exact code {code} on page.")
+    except Exception:
+        pass
+
+    print(f"Product Name: {product_name}")
+
+    result['Product Name'] = product_name
+    result['Link'] = page.url  # Save the actual current URL which should include the color
+    result['Match Verified'] = is_match
+    return result
+
+
+async def open_product_url(page, url, limiter):
+    """
+    Goes straight to a known product page. Returns True if it is still a product page
+    (i.e. it wasn't redirected away).
+    """
+    try:
+        await limiter.acquire()
+        await page.goto(url)
+        await page.wait_for_load_state('domcontentloaded')
+    except Exception as e:
+        print(f"Could not open known product page {url}: {e}")
+        return False
+    print(f"Opened known product page: {page.url}")
+    return is_product_url(page.url)
+
+
+async def _read_group(page, items):
+    results = {}
+    for index, code, color_code in items:
+        try:
+            await select_color(page, color_code)
+            results[index] = await read_product(page, code)
+        except Exception as e:
+            print(f"Error processing {code}: {e}")
+            results[index] = {**empty_result(code), 'Product Name': "Error", 'Link': str(e)}
+    return results
+
+
+async def _search_unverified(page, items, results, limiter, searched):
+    """
+    Searches each code the shared product page did not show on its own, like an ungrouped run would.
+    `searched` maps codes already searched for this group to whether that search reached a product page.
+    """
+    for index, code, color_code in items:
+        if results[index]['Match Verified'] or code in searched:
+            continue
+        try:
+            if await search_product(page, code, limiter):
+                await select_color(page, color_code)
+                results[index] = await read_product(page, code)
             else:
-                base_code = code
-                color_code = None
-                
-            print(f"Base Code: {base_code}, Color Code: {color_code}")
+                results[index] = {**empty_result(code), 'Product Name': "Search Failed", 'Link': "Search Failed"}
+        except Exception as e:
+            print(f"Error processing {code}: {e}")
+            results[index] = {**empty_result(code), 'Product Name': "Error", 'Link': str(e)}
+    return results
+
+
+async def scrape_group(page, base_code, items, limiter, product_url=None):
+    """
+    Resolves every code of one base product with a single product page load.
+    `items` is a list of (index, code, color_code). If the product page URL is already
+    known it is opened directly, otherwise the site search is used.
+    Returns {index: result row}.
+    """
+    print(f"Processing base code {base_code} ({len(items)} finishes)")
+    results = {}
+    try:
+        if product_url and await open_product_url(page, product_url, limiter):
+            results = await _read_group(page, items)
+            if any(row['Match Verified'] for row in results.values()):
+                return await _search_unverified(page, items, results, limiter, {})
+            # The stored URL is stale (product moved or replaced); look it up again
+            print(f"Known URL for {base_code} did not match, falling back to search.")
+
+        # Any code of the group leads to the same product page; try the next one if search fails
+        searched = {}
+        for _, code, _ in items:
+            searched[code] = await search_product(page, code, limiter)
+            if searched[code]:
+                break
 
+        if not any(searched.values()):
+            for index, code, _ in items:
+                result = empty_result(code)
+                result['Product Name'] = "Search Failed"
+                result['Link'] = "Search Failed"
+                results[index] = result
+            return results
+
+        results = await _read_group(page, items)
+        # Codes the page doesn't show may not belong to this product after all
+        results = await _search_unverified(page, items, results, limiter, searched)
+
+    except Exception as e:
+        print(f"Error processing {base_code}: {e}")
+        for index, code, _ in items:
+            if index not in results:
+                results[index] = {**empty_result(code), 'Product Name': "Error", 'Link': str(e)}
+
+    return results
+
+
+async def _page_worker(browser, work_queue, emit, limiter, profile, cancel_event):
+    # Each worker owns its own context so cookies/state don't leak between pages
+    context = await browser.new_context(user_agent=USER_AGENT)
+    await profile.attach(context)
+    page = await context.new_page()
+    try:
+        while not cancel_event.is_set():
             try:
-                # Direct Search on Kohler.com
-                print(f"Navigating to Kohler homepage...")
-                page.goto("https://www.kohler.com/en")
-                page.wait_for_load_state('domcontentloaded')
+                base_code, items, product_url = work_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for index, row in (await scrape_group(page, base_code, items, limiter, product_url)).items():
+                emit(index, row)
+    finally:
+        await context.close()
 
-                # Click search icon
-                try:
-                    page.click("button[aria-label='Search']")
-                    # Type code into search input
-                    page.fill("input#search-side-panel__search-control", code)
-                    # Press Enter
-                    page.keyboard.press("Enter")
-                    
-                    # Wait for navigation (URL change) or results
-                    page.wait_for_url("**/products/**", timeout=15000)
-                    print(f"Navigated to product page: {page.url}")
-                    
-                except Exception as e:
-                    print(f"Search failed or timed out: {e}")
-                    df.at[index, 'Product Name'] = "Search Failed"
-                    df.at[index, 'Link'] = "Search Failed"
-                    df.at[index, 'Match Verified'] = False
-                    continue
-
-                # Handle Color Selection
-                current_url = page.url
-                if color_code and color_code not in current_url:
-                     print(f"URL does not contain color code {color_code}. Attempting to select color...")
-                     try:
-                        color_code_upper = color_code.upper()
-                        # Selector for the input element
-                        color_input_selector = f'input[id$="-{color_code_upper}"], input[value$="-{color_code_upper}"]'
-                        
-                        # Check if such an input exists
-                        if page.locator(color_input_selector).count() > 0:
-                            color_input = page.locator(color_input_selector).first
-                            color_swatch = color_input.locator('xpath=./ancestor::div[@role="radio"]')
-                            
-                            if color_swatch.count() > 0:
-                                print(f"Found swatch for {color_code_upper}. Clicking...")
-                                color_swatch.first.click()
-                                try:
-                                    page.wait_for_url(f"**/*{color_code_upper}*", timeout=5000)
-                                    print("URL updated.")
-                                except:
-                                    print("URL did not update or timed out.")
-                            else:
-                                print(f"Found input for {color_code_upper} but could not find clickable parent swatch.")
-                        else:
-                            print(f"Color option {color_code_upper} not found on page.")
-                     except Exception as e:
-                        print(f"Error selecting color: {e}")
-
-                # Extract Product Name (H1)
-                try:
-                    product_name = page.locator('h1').first.inner_text(timeout=5000)
-                except:
-                    product_name = "Name not found"
-                
-                # Verify if the displayed product code matches the requested code
-                is_match = False
-                try:
-                    # Normalize spaces
-                    page_text = page.locator('body').inner_text()
-                    if code in page_text:
-                        is_match = True
-                        print(f"Verification Successful: Found {code} on page.")
-                    else:
-                        print(f"Verification Warning: Could not find exact code {code} on page.")
-                except:
-                    pass
-
-                print(f"Product Name: {product_name}")
-                
-                # Update DataFrame
-                df.at[index, 'Product Name'] = product_name
-                df.at[index, 'Link'] = page.url # Save the actual current URL which should include the color
-                df.at[index, 'Match Verified'] = is_match
-
-            except Exception as e:
-                print(f"Error processing {code}: {e}")
-                df.at[index, 'Product Name'] = "Error"
-                df.at[index, 'Link'] = str(e)
-                df.at[index, 'Match Verified'] = False
-            
-            # Be nice to Google
-            time.sleep(2)
-
-        browser.close()
-    
-    return df
-
-def scrape_kohler():
-    input_file = 'input.xlsx'
-    output_file = 'output.xlsx'
-    
+
+def static_url_for(code, color_code, known_urls):
+    """
+    Returns a known URL that already shows this exact code, if any.
+    A base product URL only qualifies when it already has the right finish selected,
+    since picking a swatch needs a browser.
+    """
+    url = known_urls.get(normalize_code(code))
+    if url:
+        return url
+    base_code, _ = split_variant(code)
+    if base_code == code:
+        return None
+    url = known_urls.get(normalize_code(base_code))
+    if url and (not color_code or url_has_color(url, color_code)):
+        return url
+    return None
+
+
+async def resolve_groups_static(groups, known_urls, emit, limiter, cancel_event,
+                                http_concurrency=DEFAULT_HTTP_CONCURRENCY):
+    """
+    Tries the browserless HTTP path for every code with a known product URL.
+    Emits the codes it resolves and returns the groups that still need a browser.
+    """
+    semaphore = asyncio.Semaphore(http_concurrency)
+
+    async def resolve(index, code, url):
+        async with semaphore:
+            if cancel_event.is_set():
+                return index, None
+            await limiter.acquire()
+            return index, await asyncio.to_thread(resolve_static, url, code)
+
+    tasks = []
+    for _, items in groups:
+        for index, code, color_code in items:
+            url = static_url_for(code, color_code, known_urls)
+            if url:
+                tasks.append(resolve(index, code, url))
+    if not tasks:
+        return groups
+
+    resolved = set()
+    for done in asyncio.as_completed(tasks):
+        index, row = await done
+        if row:
+            emit(index, row)
+            resolved.add(index)
+    print(f"{len(resolved)} of {len(tasks)} known product pages resolved without a browser.")
+
+    remaining = []
+    for base_code, items in groups:
+        items = [item for item in items if item[0] not in resolved]
+        if items:
+            remaining.append((base_code, items))
+    return remaining
+
+
+@asynccontextmanager
+async def launch_browser():
+    """
+    Launches a private Chromium for one run and closes it afterwards.
+    """
+    async with async_playwright() as p:
+        # Launch browser (headless=True for reliable execution in this environment)
+        browser = await p.chromium.launch(headless=True)
+        try:
+            yield browser
+        finally:
+            await browser.close()
+
+
+async def scrape_codes_async(codes, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, known_urls=None,
+                             use_http=True, on_result=None, cancel_event=None, shared_browser=None):
+    """
+    Scrapes the given codes with `concurrency` browser pages working in parallel.
+    Codes sharing a base code are handled together on one page.
+    `known_urls` maps normalized codes/base codes to product page URLs that can be opened directly;
+    with `use_http` those are first fetched without a browser, which is only launched
+    for the codes that still need it.
+    `on_result(index, row)` is called as soon as each code is finished. Setting `cancel_event`
+    stops the workers from starting new lookups; codes not reached are left as None.
+    With `shared_browser` (a browser_pool.SharedBrowser; this coroutine must then run on its
+    loop) pages are opened on the long-lived browser instead of launching a new one.
+    Returns a list of result rows in the same order as `codes`.
+    """
+    known_urls = known_urls or {}
+    cancel_event = cancel_event or threading.Event()
+    results = [None] * len(codes)
+    limiter = TokenBucket(rate)
+
+    def emit(index, row):
+        # Keep the original input values in the Code column
+        row['Code'] = codes[index]
+        results[index] = row
+        if on_result:
+            on_result(index, row)
+
+    for index, code in enumerate(codes):
+        if not str(code).strip():
+            emit(index, empty_result(code))
+
+    groups = group_codes(codes)
+    if use_http and known_urls:
+        groups = await resolve_groups_static(groups, known_urls, emit, limiter, cancel_event)
+
+    work_queue = asyncio.Queue()
+    for base_code, items in groups:
+        work_queue.put_nowait((base_code, items, known_urls.get(normalize_code(base_code))))
+
+    if not work_queue.empty() and not cancel_event.is_set():
+        # Skip images, fonts, media and trackers; we only read text and form fields
+        profile = kohler_profile()
+        async with (shared_browser.borrow() if shared_browser else launch_browser()) as browser:
+            workers = max(1, min(concurrency, work_queue.qsize()))
+            await asyncio.gather(*(
+                _page_worker(browser, work_queue, emit, limiter, profile, cancel_event) for _ in range(workers)
+            ))
+        print(profile.report())
+
+    return results
+
+
+def iter_process_codes(codes_list, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                       use_cache=True, force_refresh=False, cache_ttl_hours=DEFAULT_TTL_HOURS,
+                       use_url_index=True, use_http=True, journal=None, cancel_event=None,
+                       shared_browser=None):
+    """
+    Generator version of process_codes: yields (index, row) for each code as soon as it
+    is finished. Rows already in `journal` (from an interrupted run) and cached rows come
+    first; scraped rows follow in completion order. Every new row is appended to `journal`.
+    Setting `cancel_event` (or closing the generator) stops the scrape after the lookups
+    already in progress. Pass a `shared_browser` to reuse a long-lived Chromium.
+    """
+    codes = list(codes_list)
+    cancel_event = cancel_event or threading.Event()
+    done = journal.load() if journal else {}
+
+    cache = ResultCache(ttl_hours=cache_ttl_hours) if use_cache else None
+    cached = cache.get_many(codes) if cache and not force_refresh else {}
+
+    pending = []
+    for index, code in enumerate(codes):
+        key = row_key(index, code)
+        if key in done:
+            yield index, done[key]
+            continue
+        hit = cached.get(normalize_code(code))
+        if hit:
+            row = {'Code': code, **hit}
+            if journal:
+                journal.append(key, row)
+            yield index, row
+        else:
+            pending.append(index)
+    print(f"{len(codes) - len(pending)} codes already done or cached, {len(pending)} to scrape.")
+
+    if not pending:
+        return
+
+    pending_codes = [codes[i] for i in pending]
+    url_index = UrlIndex() if use_url_index else None
+    known_urls = {}
+    if url_index:
+        stripped = [str(c).strip() for c in pending_codes]
+        known_urls = url_index.lookup_many(stripped + [split_variant(c)[0] for c in stripped])
+        print(f"{len(known_urls)} codes/base codes found in the URL index.")
+
+    # The async engine runs in its own thread and hands rows over as they finish
+    finished = queue.Queue()
+
+    def run_engine():
+        try:
+            engine_run = scrape_codes_async(
+                pending_codes, concurrency=concurrency, rate=rate, known_urls=known_urls, use_http=use_http,
+                on_result=lambda i, row: finished.put((pending[i], row)), cancel_event=cancel_event,
+                shared_browser=shared_browser,
+            )
+            if shared_browser:
+                shared_browser.submit(engine_run).result()
+            else:
+                asyncio.run(engine_run)
+        except Exception as e:
+            finished.put(e)
+        finally:
+            finished.put(None)
+
+    engine = threading.Thread(target=run_engine, daemon=True)
+    engine.start()
+    completed = False
+    try:
+        while True:
+            item = finished.get()
+            if item is None:
+                completed = True
+                break
+            if isinstance(item, Exception):
+                raise item
+            index, row = item
+            if cache:
+                cache.put_many([row])
+            if url_index:
+                url_index.record_results([row])
+            if journal:
+                journal.append(row_key(index, codes[index]), row)
+            yield index, row
+    finally:
+        if not completed:
+            # The caller stopped iterating early; don't start any more lookups
+            cancel_event.set()
+        engine.join()
+
+
+def process_codes(codes_list, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                  use_cache=True, force_refresh=False, cache_ttl_hours=DEFAULT_TTL_HOURS,
+                  use_url_index=True, use_http=True, journal=None):
+    """
+    Takes a list of product codes, scrapes Kohler.com, and returns a DataFrame with results.
+    Codes found in the result cache (and younger than `cache_ttl_hours`) are not scraped again
+    unless `force_refresh` is set. Products already in the URL index are opened directly
+    instead of going through the site search, or fetched without a browser when
+    `use_http` is set and the static page is enough.
+    """
+    codes = list(codes_list)
+    rows = [None] * len(codes)
+    for index, row in iter_process_codes(
+        codes, concurrency=concurrency, rate=rate, use_cache=use_cache, force_refresh=force_refresh,
+        cache_ttl_hours=cache_ttl_hours, use_url_index=use_url_index, use_http=use_http, journal=journal,
+    ):
+        rows[index] = row
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def scrape_kohler(input_file='input.xlsx', output_file='output.xlsx', resume=False):
+    """
+    Scrapes every code in `input_file` and writes the results to `output_file`.
+    Rows are journaled to `<output_file>.journal.jsonl` as they finish; with `resume`
+    an interrupted run continues from the journal instead of starting over.
+    """
     try:
         input_df = pd.read_excel(input_file)
     except FileNotFoundError:
@@ -148,12 +531,24 @@ def scrape_kohler():
         return
 
     codes = input_df['Code'].tolist()
-    result_df = process_codes(codes)
-    
-    # Merge results back if needed, or just save the result_df
-    # For simplicity, let's just save the result_df which has the codes and results
-    result_df.to_excel(output_file, index=False)
+    journal = Journal(output_file + '.journal.jsonl')
+    if not resume:
+        journal.reset()
+
+    for index, row in iter_process_codes(codes, journal=journal):
+        print(f"[{index + 1}/{len(codes)}] {row['Code']}: {row['Product Name']}")
+
+    # Build the output from the journal so resumed rows are included
+    keys = [row_key(index, code) for index, code in enumerate(codes)]
+    result_df = pd.DataFrame(journal.rows_for(keys), columns=RESULT_COLUMNS)
+    # .csv/.parquet output names switch format; xlsx is streamed and split into sheets past Excel's row limit
+    write_dataframe(result_df, output_file)
     print(f"Done. Results saved to {output_file}")
 
 if __name__ == "__main__":
-    scrape_kohler()
+    parser = argparse.ArgumentParser(description="Scrape Kohler.com product names and links.")
+    parser.add_argument("--input", default="input.xlsx")
+    parser.add_argument("--output", default="output.xlsx", help="Results file: .xlsx, .csv or .parquet")
+    parser.add_argument("--resume", action="store_true", help="Skip rows already recorded by an interrupted run")
+    args = parser.parse_args()
+    scrape_kohler(args.input, args.output, resume=args.resume)
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from importlib import metadata
+
+# Survives app restarts within the same deployment (container image / home volume)
+STATE_DIR = os.environ.get(
+    "KOHLER_STATE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "kohler-automation"),
+)
+
+
+class StartupTimer:
+    """
+    Records how long each startup step of one script run takes.
+    """
+
+    def __init__(self, started=None):
+        self.started = started or time.perf_counter()
+        self.steps = []
+
+    @contextmanager
+    def step(self, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((label, (time.perf_counter() - start) * 1000))
+
+    def mark(self, label):
+        """
+        Records the time elapsed since the run started.
+        """
+        self.steps.append((label, self.total_ms()))
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def report(self):
+        lines = [f"- {label}: {ms:.0f} ms" for label, ms in self.steps]
+        lines.append(f"- **Total: {self.total_ms():.0f} ms**")
+        return "\n".join(lines)
+
+
+def _playwright_marker():
+    try:
+        version = metadata.version("playwright")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    # A new Playwright version needs its matching Chromium build, so the marker is per version
+    return os.path.join(STATE_DIR, f"playwright-{version}-chromium.installed")
+
+
+def ensure_playwright_browsers():
+    """
+    Installs Playwright's Chromium the first time it is needed in this deployment.
+    Returns True if an install was run. Later calls only check for the marker file.
+    """
+    marker = _playwright_marker()
+    if os.path.exists(marker):
+        return False
+    result = subprocess.run([sys.executable, "-m", "playwright", "install", "chromium"])
+    if result.returncode == 0:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with open(marker, "w") as f:
+            f.write("installed")
+    return True
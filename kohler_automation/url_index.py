@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import pandas as pd
+from kohler_codes import normalize_code, split_variant
+from result_cache import DEFAULT_CACHE_PATH, sqlite_connect
+
+
+def is_product_url(url):
+    return isinstance(url, str) and url.startswith("http") and "/products/" in url
+
+
+class UrlIndex:
+    """
+    Persistent map from product code to its Kohler.com product page.
+    Both the full code and its base code are stored, so any finish of a known
+    product can go straight to the product page instead of using site search.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS product_urls (
+                    code TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def lookup_many(self, codes):
+        """
+        Returns {normalized_code: url} for the given codes that are in the index.
+        """
+        keys = list({normalize_code(c) for c in codes})
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT code, url FROM product_urls WHERE code IN ({placeholders})", chunk)
+                found.update(rows)
+        return found
+
+    def record(self, pairs):
+        """
+        Stores (code, url) pairs, indexing each under its full code and its base code.
+        Pairs whose url is not a product page are ignored. Returns the number of codes stored.
+        """
+        now = time.time()
+        values = {}
+        for code, url in pairs:
+            code = str(code).strip()
+            if not code or not is_product_url(url):
+                continue
+            base_code, _ = split_variant(code)
+            values[normalize_code(code)] = (url, now)
+            values[normalize_code(base_code)] = (url, now)
+        if values:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO product_urls (code, url, updated_at) VALUES (?, ?, ?)",
+                    [(code, url, ts) for code, (url, ts) in values.items()],
+                )
+        return len(values)
+
+    def record_results(self, rows):
+        """
+        Adds the links of successful scrape results (rows with Code/Link/Match Verified).
+        """
+        return self.record((row['Code'], row['Link']) for row in rows if row['Match Verified'])
+
+    def import_file(self, path):
+        """
+        Seeds the index from an Excel/CSV file with 'Code' and 'Link' columns,
+        e.g. a previous output.xlsx.
+        """
+        if path.lower().endswith(".csv"):
+            df = pd.read_csv(path)
+        else:
+            df = pd.read_excel(path)
+        if 'Code' not in df.columns or 'Link' not in df.columns:
+            raise ValueError(f"{path} needs 'Code' and 'Link' columns.")
+        return self.record(zip(df['Code'], df['Link']))
+
+
+if __name__ == "__main__":
+    # Usage: python url_index.py <file.xlsx|file.csv> [...]
+    if len(sys.argv) < 2:
+        print("Usage: python url_index.py <file.xlsx|file.csv> [...]")
+        sys.exit(1)
+    index = UrlIndex()
+    for file_path in sys.argv[1:]:
+        if not os.path.exists(file_path):
+            print(f"Error: {file_path} not found.")
+            continue
+        count = index.import_file(file_path)
+        print(f"Imported {count} codes from {file_path}")
@@ -1,61 +1,348 @@
+"""
+OCR throughput benchmark for the PDF Highlighter pipeline (pdf_ocr.py).
+
+Generates test PDFs (native text, scanned images only, and mixed pages), OCRs them over a
+sweep of DPI, grayscale rendering, executor type and worker count, and reports pages/sec,
+p50/p95 per-page latency and peak RSS (this process plus its workers and Tesseract runs).
+
+    python verify_ocr_perf.py --sizes 10 100 --json results.json
+    python verify_ocr_perf.py --sizes 10 100 --compare results.json   # flags regressions, exits 1
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
 import fitz
 import pytesseract
 from PIL import Image
-import concurrent.futures
-import time
-import os
+import pdf_ocr
+from pdf_ocr import available_cpus, memory_in_use_mb, ocr_page, page_chunks, page_needs_ocr, tesseract_version
 
 # Mock Tesseract path if needed (same as app.py)
 tesseract_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 if os.path.exists(tesseract_path):
     pytesseract.pytesseract.tesseract_cmd = tesseract_path
 
-def create_dummy_pdf(filename="test.pdf", pages=3):
+KINDS = ["native", "scanned", "mixed"]
+EXECUTORS = ["serial", "thread", "process"]
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_corpus")
+# Scanned pages are rendered at this DPI before being embedded, like a typical office scanner
+SCAN_DPI = 150
+# A result is a regression if it is this much worse than the baseline
+DEFAULT_TOLERANCE = 0.10
+
+WORDS = ("faucet shower valve drain finish polished chrome brushed nickel cartridge spout handle "
+         "basin toilet flush seat ceramic mounting bracket aerator flow rate gallons minute").split()
+
+
+def _paragraph(rng, lines=30, words_per_line=9):
+    return "\n".join(" ".join(rng.choice(WORDS) for _ in range(words_per_line)) for _ in range(lines))
+
+
+def _scan_of(text, rect):
+    """
+    JPEG of a page showing `text`, as a scanner would produce it (no text layer).
+    """
+    with fitz.open() as tmp:
+        page = tmp.new_page(width=rect.width, height=rect.height)
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=11)
+        pix = page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY)
+        return pix.tobytes("jpeg", jpg_quality=80)
+
+
+def make_corpus(kind, pages, path, seed=0):
+    """
+    Writes a `pages`-page PDF: "native" pages have only a text layer, "scanned" pages only a
+    page-sized image of text, and "mixed" pages native text on the top half and a scanned
+    block on the bottom half. Every page has different text.
+    """
+    rng = random.Random(f"{kind}-{seed}")
     doc = fitz.open()
-    for i in range(pages):
+    for page_num in range(pages):
         page = doc.new_page()
-        page.insert_text((50, 50), f"This is page {i+1} with some text to OCR.", fontsize=20)
-    doc.save(filename)
+        text = f"Page {page_num + 1}\n" + _paragraph(rng)
+        if kind == "native":
+            page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=11)
+        elif kind == "scanned":
+            page.insert_image(page.rect, stream=_scan_of(text, page.rect))
+        else:
+            top = fitz.Rect(0, 0, page.rect.width, page.rect.height / 2)
+            bottom = fitz.Rect(0, page.rect.height / 2, page.rect.width, page.rect.height)
+            # insert_textbox writes nothing if the text doesn't fit, so half a page gets half the text
+            text = f"Page {page_num + 1}\n" + _paragraph(rng, lines=20)
+            page.insert_textbox(top + (50, 50, -50, -10), text, fontsize=11)
+            page.insert_image(bottom, stream=_scan_of(_paragraph(rng, lines=12), bottom))
+    doc.save(path, garbage=3, deflate=True)
     doc.close()
-    return filename
+    return path
+
 
-def process_page_ocr(page_num, pdf_filename, dpi=200):
+def corpus_path(corpus_dir, kind, pages, regenerate=False):
+    """
+    Path of the cached test PDF for (kind, pages), generated on first use.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    path = os.path.join(corpus_dir, f"{kind}_{pages}.pdf")
+    if regenerate or not os.path.exists(path):
+        started = time.perf_counter()
+        make_corpus(kind, pages, path)
+        print(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def _ocr_page_rgb(doc, page_num, dpi):
+    # The pre-grayscale path: render RGB, convert to grayscale in PIL, then OCR
     try:
-        # Open file directly here
-        doc = fitz.open(pdf_filename)
-        page = doc[page_num]
-        
-        pix = page.get_pixmap(dpi=dpi)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        img = img.convert('L')
-        
-        ocr_data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
-        return f"Page {page_num}: Success, Words: {len(ocr_data['text'])}"
+        pix = doc[page_num].get_pixmap(dpi=dpi)
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples).convert("L")
+        pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+        return {"page_num": page_num}
     except Exception as e:
-        return f"Page {page_num}: Error: {e}"
+        return {"page_num": page_num, "error": str(e)}
+
+
+def bench_page(doc, page_num, dpi, grayscale):
+    """
+    OCRs one page and returns (seconds, error or None). The grayscale path is pdf_ocr.ocr_page itself.
+    """
+    started = time.perf_counter()
+    res = ocr_page(doc, page_num, dpi) if grayscale else _ocr_page_rgb(doc, page_num, dpi)
+    return time.perf_counter() - started, res.get("error")
+
+
+def _bench_chunk(page_nums, dpi, grayscale):
+    # Runs in a pdf_ocr worker process, on the document its initializer opened
+    return [bench_page(pdf_ocr._worker_doc, page_num, dpi, grayscale) for page_num in page_nums]
+
+
+def _run_serial(pdf_path, page_nums, dpi, grayscale, workers):
+    with fitz.open(pdf_path) as doc:
+        return [bench_page(doc, page_num, dpi, grayscale) for page_num in page_nums]
+
+
+def _run_threads(pdf_path, page_nums, dpi, grayscale, workers):
+    # A fitz document can't be shared between threads: one per thread
+    local = threading.local()
+
+    def work(page_num):
+        if not hasattr(local, "doc"):
+            local.doc = fitz.open(pdf_path)
+        return bench_page(local.doc, page_num, dpi, grayscale)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(work, page_nums))
+
+
+def _run_processes(pdf_path, page_nums, dpi, grayscale, workers):
+    # Same pool and chunking as pdf_ocr.ocr_document
+    timings = []
+    with pdf_ocr._process_pool(pdf_path, workers) as executor:
+        futures = [executor.submit(_bench_chunk, chunk, dpi, grayscale) for chunk in page_chunks(page_nums, workers)]
+        for future in concurrent.futures.as_completed(futures):
+            timings.extend(future.result())
+    return timings
+
+
+RUNNERS = {"serial": _run_serial, "thread": _run_threads, "process": _run_processes}
+
+
+class PeakMemory:
+    """
+    Samples memory_in_use_mb() (this process plus child processes) on a background thread
+    while the with-block runs. peak_mb stays None where memory can't be measured
+    (no psutil and no /proc).
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+
+    def _measure(self):
+        used = memory_in_use_mb()
+        if used is not None:
+            self.peak_mb = max(self.peak_mb or 0.0, used)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._measure()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._measure()
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))] if values else 0.0
+
+
+def run_config(pdf_path, kind, pages, dpi, grayscale, executor, workers, selective=False):
+    with fitz.open(pdf_path) as doc:
+        page_nums = [n for n in range(len(doc)) if not selective or page_needs_ocr(doc[n])]
+
+    started = time.perf_counter()
+    with PeakMemory() as memory:
+        timings = RUNNERS[executor](pdf_path, page_nums, dpi, grayscale, workers) if page_nums else []
+    wall = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for seconds, _ in timings]
+    errors = [error for _, error in timings if error]
+    return {
+        "kind": kind,
+        "pages": pages,
+        "dpi": dpi,
+        "grayscale": grayscale,
+        "executor": executor,
+        "workers": workers,
+        "selective": selective,
+        "ocr_pages": len(page_nums),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_s": wall,
+        # Pages of the document per second, so selective runs count the pages they skipped
+        "pages_per_sec": pages / wall if wall else 0.0,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "peak_rss_mb": memory.peak_mb,
+    }
+
+
+def config_key(result):
+    return tuple(result[name] for name in ("kind", "pages", "dpi", "grayscale", "executor", "workers", "selective"))
+
+
+def sweep(args):
+    """
+    Yields one result per combination of the requested corpora and settings.
+    """
+    for kind in args.kinds:
+        for pages in args.sizes:
+            pdf_path = corpus_path(args.corpus_dir, kind, pages, args.regenerate)
+            for dpi in args.dpi:
+                for grayscale in args.grayscale:
+                    for executor in args.executors:
+                        # A serial run is the same at every worker count
+                        for workers in ([1] if executor == "serial" else args.workers):
+                            best = None
+                            for _ in range(args.repeat):
+                                result = run_config(pdf_path, kind, pages, dpi, grayscale, executor, workers,
+                                                    args.selective)
+                                if best is None or result["pages_per_sec"] > best["pages_per_sec"]:
+                                    best = result
+                            print_result(best)
+                            yield best
+
+
+def print_header():
+    print(f"{'corpus':<13} {'dpi':>4} {'gray':>5} {'executor':<8} {'wkrs':>4} {'pages/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8} {'errors':>6}")
+
+
+def print_result(r):
+    peak = "n/a" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f}"
+    print(f"{r['kind'] + '_' + str(r['pages']):<13} {r['dpi']:>4} {str(r['grayscale']):>5} {r['executor']:<8} "
+          f"{r['workers']:>4} {r['pages_per_sec']:>8.2f} {r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} "
+          f"{peak:>8} {r['errors']:>6}")
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Matches results to the baseline by configuration. Returns a list of regression messages:
+    throughput down, or p95 latency / peak RSS up, by more than `tolerance`.
+    """
+    previous = {config_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get(config_key(r))
+        if old is None:
+            print(f"  no baseline for {config_key(r)}")
+            continue
+        if r["errors"] or old["errors"]:
+            print(f"  skipped {config_key(r)}: pages failed OCR")
+            continue
+        checks = [
+            ("pages/sec", old["pages_per_sec"], r["pages_per_sec"], -1),
+            ("p95 ms", old["p95_ms"], r["p95_ms"], 1),
+            ("peak MB", old["peak_rss_mb"], r["peak_rss_mb"], 1),
+        ]
+        for name, before, after, worse in checks:
+            if before is None or after is None:
+                # Memory wasn't measurable on one of the two machines
+                continue
+            change = (after - before) / before if before else 0.0
+            if change * worse > tolerance:
+                regressions.append(f"{config_key(r)}: {name} {before:.2f} -> {after:.2f} ({change:+.0%})")
+    return regressions
+
+
+def _bool(value):
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR throughput benchmark for the PDF Highlighter pipeline.")
+    parser.add_argument("--kinds", nargs="+", default=KINDS, choices=KINDS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Pages per test PDF")
+    parser.add_argument("--dpi", nargs="+", type=int, default=[pdf_ocr.DEFAULT_DPI])
+    parser.add_argument("--grayscale", nargs="+", type=_bool, default=[True],
+                        help="true = render straight to grayscale (current path), false = RGB then convert")
+    parser.add_argument("--executors", nargs="+", default=["process"], choices=EXECUTORS)
+    parser.add_argument("--workers", nargs="+", type=int, default=sorted({1, available_cpus()}))
+    parser.add_argument("--selective", action="store_true", help="Skip pages that already have a text layer")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration; the fastest is kept")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the test PDFs")
+    parser.add_argument("--json", help="Write the results to this JSON file (usable as a --compare baseline)")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    version = tesseract_version()
+    if version is None:
+        print("Warning: Tesseract not found, every OCR page will fail.")
+    meta = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tesseract": version,
+        "pymupdf": fitz.VersionBind,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": available_cpus(),
+    }
+    print(f"Tesseract {version}, PyMuPDF {meta['pymupdf']}, {meta['cpus']} CPUs")
+
+    print_header()
+    results = list(sweep(args))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Comparing against {args.compare} ({baseline['meta'].get('started_at')}), tolerance {args.tolerance:.0%}")
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"  REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print("  No regressions.")
 
-def test_parallel_ocr(filename):
-    doc = fitz.open(filename)
-    num_pages = len(doc)
-    doc.close()
-    
-    start_time = time.time()
-    results = []
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_to_page = {
-            executor.submit(process_page_ocr, i, filename, 200): i 
-            for i in range(num_pages)
-        }
-        
-        for future in concurrent.futures.as_completed(future_to_page):
-            results.append(future.result())
-            
-    end_time = time.time()
-    print(f"Processed {num_pages} pages in {end_time - start_time:.2f} seconds.")
-    for res in results:
-        print(res)
 
 if __name__ == "__main__":
-    pdf_file = create_dummy_pdf()
-    print(f"Created {pdf_file}")
-    test_parallel_ocr(pdf_file)
+    main()
@@ -0,0 +1,82 @@
+import sys
+import fitz
+import numpy as np
+from pdf_ocr import embed_text_layer
+
+# Rendering DPI used to measure the ink box of each word, like Tesseract reports it
+INK_DPI = 600
+# Share of a word's ink box a search hit on the embedded layer must cover horizontally
+MIN_OVERLAP = 0.9
+# How far (share of the font size) the embedded text's baseline may sit from the printed one
+MAX_BASELINE_SHIFT = 0.05
+
+LINES = [
+    ((50, 100), "hello world the weight is 12 kg", "tiro", 11),
+    ((50, 130), "Quick jumping Polished Chrome", "helv", 11),
+    ((50, 170), "Part number K-23475-4-AF", "cour", 16),
+    # Marks that sit above the baseline must not lift the rest of the line
+    ((50, 210), 'Finish - "Brushed" nickel', "helv", 14),
+]
+PHRASES = ["hello world", "Polished Chrome", "Part number K-23475-4-AF"]
+
+
+def ink_words(page):
+    """
+    The page's words as (page_num, line_id, ink box, text): the dark-pixel bounds of each
+    word rather than its font box, which is what OCR word boxes are.
+    """
+    zoom = INK_DPI / 72
+    pix = page.get_pixmap(dpi=INK_DPI, colorspace=fitz.csGRAY)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+    words = []
+    for x0, y0, x1, y1, text, block, line, _ in page.get_text("words"):
+        top, left = int(y0 * zoom), int(x0 * zoom)
+        ys, xs = np.nonzero(img[top:int(y1 * zoom) + 1, left:int(x1 * zoom) + 1] < 128)
+        ink = ((left + xs.min()) / zoom, (top + ys.min()) / zoom,
+               (left + xs.max() + 1) / zoom, (top + ys.max() + 1) / zoom)
+        words.append((page.number, (block, line), ink, text))
+    return words
+
+
+def main():
+    source = fitz.open()
+    page = source.new_page()
+    for origin, text, font, size in LINES:
+        page.insert_text(origin, text, fontname=font, fontsize=size)
+    words = ink_words(page)
+
+    # Embed into a blank page, as for a scan with no text of its own
+    target = fitz.open()
+    target.new_page()
+    embed_text_layer(target, words)
+    embedded = target[0]
+
+    failures = []
+    for _, _, ink, text in words:
+        box = fitz.Rect(ink)
+        hits = embedded.search_for(text)
+        overlap = max(((min(h.x1, box.x1) - max(h.x0, box.x0)) / box.width for h in hits), default=0)
+        status = "ok" if overlap >= MIN_OVERLAP else "MISPLACED"
+        print(f"{text:14} OCR box x {box.x0:6.1f}-{box.x1:6.1f}  found {[f'{h.x0:.1f}-{h.x1:.1f}' for h in hits]}  {status}")
+        if status != "ok":
+            failures.append(text)
+    embedded_baselines = [span["origin"][1] for block in embedded.get_text("dict")["blocks"]
+                          for line in block["lines"] for span in line["spans"]]
+    for (_, y), text, _, size in LINES:
+        shift = min((abs(b - y) for b in embedded_baselines), default=size)
+        if shift > MAX_BASELINE_SHIFT * size:
+            print(f"Baseline off by {shift:.2f}pt: {text!r}")
+            failures.append(text)
+    for phrase in PHRASES:
+        if not embedded.search_for(phrase):
+            print(f"Phrase not found: {phrase!r}")
+            failures.append(phrase)
+
+    if failures:
+        print(f"FAILED: {len(failures)} words/phrases not found on their OCR boxes")
+        sys.exit(1)
+    print("Embedded text layer matches the OCR boxes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import string
+from collections import defaultdict
+import numpy as np
+
+# Stripped from both ends of words and search terms ("weight:" matches "weight")
+_PUNCTUATION = string.punctuation + "“”‘’«»…–—"
+
+NATIVE = "native"
+OCR = "ocr"
+
+# OCR boxes below this Tesseract confidence are not indexed (-1 marks block/line boxes, not words)
+MIN_WORD_CONFIDENCE = 0
+
+
+def normalize_word(text):
+    return str(text).strip().lower().strip(_PUNCTUATION)
+
+
+def _matches(mode, token, key):
+    if mode == "exact":
+        return key == token
+    if mode == "contains":
+        return token in key
+    if mode == "suffix":
+        return key.endswith(token)
+    return key.startswith(token)
+
+
+def ocr_columns(ocr_data):
+    """
+    image_to_data output (dict of lists) as numpy columns.
+    """
+    columns = {name: np.asarray(ocr_data[name], dtype=float) for name in ("left", "top", "width", "height", "conf")}
+    columns.update({name: np.asarray(ocr_data[name], dtype=int) for name in ("block_num", "par_num", "line_num")})
+    columns["text"] = np.asarray([str(text).strip() for text in ocr_data["text"]], dtype=str)
+    return columns
+
+
+class WordIndex:
+    """
+    Every word of a document (native text layer and OCR boxes) in reading order, with its
+    page, block, line and rectangle in PDF coordinates, plus an inverted index from
+    normalized word to positions. Built once per document; each query then only touches
+    the positions of its rarest word instead of rescanning the whole document.
+    """
+
+    def __init__(self):
+        self.keys = []      # normalized word
+        self.texts = []     # word as read
+        self.rects = []     # (x0, y0, x1, y1) in PDF points
+        self.pages = []
+        self.blocks = []    # (page, source, block): phrases never cross these
+        self.line_ids = []  # one id per (page, source, block, line)
+        self.sources = []
+        self.postings = defaultdict(list)
+        self._line_keys = {}
+        self._rect_array = None
+        self._vocab = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add_word(self, page_num, rect, text, block, line, source):
+        key = normalize_word(text)
+        if not key:
+            return
+        line_id = self._line_keys.setdefault((page_num, source, block, line), len(self._line_keys))
+        self.postings[key].append(len(self.keys))
+        self.keys.append(key)
+        self.texts.append(str(text).strip())
+        self.rects.append(tuple(float(v) for v in rect))
+        self.pages.append(page_num)
+        self.blocks.append((page_num, source, block))
+        self.line_ids.append(line_id)
+        self.sources.append(source)
+        self._rect_array = self._vocab = None
+
+    def add_native_words(self, page_num, words):
+        """
+        Adds the output of page.get_text("words"): (x0, y0, x1, y1, word, block_no, line_no, word_no).
+        """
+        for x0, y0, x1, y1, text, block, line, _ in words:
+            self.add_word(page_num, (x0, y0, x1, y1), text, block, line, NATIVE)
+
+    def add_ocr_words(self, res, skip_rects=(), min_conf=MIN_WORD_CONFIDENCE):
+        """
+        Adds the words of one pdf_ocr page result, mapped from pixels to PDF points.
+        Low-confidence boxes and words whose centre falls inside one of skip_rects (native
+        words already indexed for the page) are left out, so mixed pages don't get
+        highlighted twice. Filtering and the coordinate transform run on whole columns.
+        """
+        columns = ocr_columns(res["ocr_data"])
+        scale = np.array([res["rect_width"] / res["width"], res["rect_height"] / res["height"]] * 2)
+        boxes = np.column_stack([
+            columns["left"], columns["top"],
+            columns["left"] + columns["width"], columns["top"] + columns["height"],
+        ]) * scale
+
+        keep = (columns["conf"] >= min_conf) & (np.char.str_len(columns["text"]) > 0)
+        if len(skip_rects) and keep.any():
+            native = np.asarray(skip_rects, dtype=float)
+            cx = ((boxes[:, 0] + boxes[:, 2]) / 2)[:, None]
+            cy = ((boxes[:, 1] + boxes[:, 3]) / 2)[:, None]
+            inside = (cx >= native[:, 0]) & (cx <= native[:, 2]) & (cy >= native[:, 1]) & (cy <= native[:, 3])
+            keep &= ~inside.any(axis=1)
+
+        for i in np.flatnonzero(keep):
+            line = (int(columns["par_num"][i]), int(columns["line_num"][i]))
+            self.add_word(res["page_num"], boxes[i], columns["text"][i], int(columns["block_num"][i]), line, OCR)
+
+    def add_page(self, page, ocr_result=None):
+        """
+        Indexes the native words of a fitz page plus its OCR result (if any and not failed).
+        """
+        words = page.get_text("words")
+        self.add_native_words(page.number, words)
+        if ocr_result and "error" not in ocr_result:
+            self.add_ocr_words(ocr_result, [w[:4] for w in words])
+
+    @classmethod
+    def from_document(cls, doc, ocr_results=()):
+        """
+        Indexes the native words of every page of a fitz document plus the given OCR page results.
+        """
+        index = cls()
+        ocr_by_page = {res["page_num"]: res for res in ocr_results}
+        for page in doc:
+            index.add_page(page, ocr_by_page.get(page.number))
+        return index
+
+    def words(self, source=None):
+        """
+        Yields (page_num, line_id, rect, text) for every indexed word, or only those from `source`.
+        """
+        for i, text in enumerate(self.texts):
+            if source is None or self.sources[i] == source:
+                yield self.pages[i], self.line_ids[i], self.rects[i], text
+
+    def _candidates(self, token, mode):
+        if mode == "exact":
+            return self.postings.get(token, [])
+        # Partial matches scan the vocabulary (distinct words, as one numpy array), not every word
+        if self._vocab is None:
+            keys = list(self.postings)
+            self._vocab = (keys, np.array(keys, dtype=str))
+        keys, vocab = self._vocab
+        if not keys:
+            return []
+        if mode == "contains":
+            hits = np.char.find(vocab, token) >= 0
+        elif mode == "suffix":
+            hits = np.char.endswith(vocab, token)
+        else:
+            hits = np.char.startswith(vocab, token)
+        return [word_id for i in np.flatnonzero(hits) for word_id in self.postings[keys[i]]]
+
+    def line_rects(self, start, end):
+        """
+        Rectangles covering words start..end-1, merged into one rectangle per line.
+        """
+        if self._rect_array is None:
+            self._rect_array = np.asarray(self.rects, dtype=float).reshape(-1, 4)
+        rects = self._rect_array[start:end]
+        bounds = np.flatnonzero(np.diff(self.line_ids[start:end])) + 1
+        return [
+            (float(part[:, 0].min()), float(part[:, 1].min()), float(part[:, 2].max()), float(part[:, 3].max()))
+            for part in np.split(rects, bounds)
+        ]
+
+    def find(self, term):
+        """
+        Returns the matches of one term as [(page_num, [rects, one per line])], in document order.
+        A single word matches any word containing it (like the old substring test);
+        a phrase matches consecutive words in the same block, where the first word may
+        end with and the last word may start with the given text (like page.search_for).
+        """
+        tokens = [t for t in (normalize_word(w) for w in str(term).split()) if t]
+        if not tokens:
+            return []
+        if len(tokens) == 1:
+            modes = ["contains"]
+        else:
+            modes = ["suffix"] + ["exact"] * (len(tokens) - 2) + ["prefix"]
+
+        # Anchor on the rarest whole word of the phrase; edge words need a vocabulary scan
+        exact = [j for j, mode in enumerate(modes) if mode == "exact"]
+        pivot = min(exact, key=lambda j: len(self.postings.get(tokens[j], []))) if exact else 0
+
+        starts = []
+        for word_id in self._candidates(tokens[pivot], modes[pivot]):
+            start = word_id - pivot
+            end = start + len(tokens)
+            if start < 0 or end > len(self.keys):
+                continue
+            if any(self.blocks[i] != self.blocks[start] for i in range(start, end)):
+                continue
+            if all(_matches(modes[j], tokens[j], self.keys[start + j]) for j in range(len(tokens))):
+                starts.append(start)
+        starts.sort()
+        return [(self.pages[start], self.line_rects(start, start + len(tokens))) for start in starts]
+
+    def search(self, terms):
+        """
+        Runs several terms against the index. Returns {term: matches} (see find).
+        """
+        return {term: self.find(term) for term in terms}